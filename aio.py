@@ -0,0 +1,395 @@
+import asyncio
+import io
+import sys
+from datetime import datetime
+
+from flask import abort, g, render_template, request
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from werkzeug.exceptions import HTTPException
+
+from filters import format_datetimes
+from models import Area, Artist, Show, Venue, db, page_size, paginate, read_only
+import cache
+import dates
+import facets
+import search
+
+# ----------------------------------------------------------------------------#
+# Async read views.
+#
+# The listing, detail and search pages as coroutines for the ASGI entry
+# point (asgi.py). AsyncApp runs them on the ASGI server's event loop, one
+# task per request, and hands every other route to the WSGI app. Queries
+# are the same builders the sync views use (Area.venues_query(),
+# Show.listing_query(), ...), executed through AsyncSession on a pooled
+# async engine per bind that lives as long as the loop; independent queries
+# of a page (the entity, its past and its upcoming shows, the calendar, the
+# genre counts) run concurrently, each on its own pooled connection.
+# Writes stay on the sync app.
+# ----------------------------------------------------------------------------#
+
+ASYNC_DRIVERS = {
+    'postgresql': 'postgresql+asyncpg',
+    'sqlite': 'sqlite+aiosqlite',
+}
+
+# bind ('primary', 'replica') -> async_sessionmaker, built on the running loop
+sessions = {}
+
+
+def async_url(url):
+    # postgresql://... -> postgresql+asyncpg://..., sqlite:// -> sqlite+aiosqlite://
+    url = make_url(url)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise RuntimeError(f"no async driver configured for {backend}; set ASYNC_DATABASE_URL")
+    return url.set(drivername=ASYNC_DRIVERS[backend])
+
+
+def engine_options(config, url):
+    # config.py's pool settings; asyncpg takes the statement timeout as a
+    # server setting instead of psycopg2's options string
+    options = {"pool_pre_ping": config['DB_POOL_PRE_PING']}
+    backend = url.get_backend_name()
+    if backend == 'sqlite' and url.database in (None, '', ':memory:'):
+        # one in-memory database, which a pool would not share
+        return options
+    # aiosqlite would otherwise open a new connection per session (NullPool)
+    options.update(poolclass=AsyncAdaptedQueuePool,
+                   pool_size=config['DB_POOL_SIZE'],
+                   max_overflow=config['DB_MAX_OVERFLOW'],
+                   pool_recycle=config['DB_POOL_RECYCLE'])
+    if backend == 'postgresql' and config['DB_STATEMENT_TIMEOUT']:
+        options["connect_args"] = {"server_settings": {"statement_timeout": str(config['DB_STATEMENT_TIMEOUT'])}}
+    return options
+
+
+def start(app):
+    # called on the server's event loop, whose connections the pools keep
+    config = app.config
+    urls = {'primary': make_url(config['ASYNC_DATABASE_URL']) if config['ASYNC_DATABASE_URL']
+            else async_url(config['SQLALCHEMY_DATABASE_URI'])}
+    if config['SQLALCHEMY_BINDS'].get('replica'):
+        urls['replica'] = async_url(config['SQLALCHEMY_BINDS']['replica'])
+    for bind, url in urls.items():
+        engine = create_async_engine(url, **engine_options(config, url))
+        sessions[bind] = async_sessionmaker(engine, expire_on_commit=False)
+
+
+async def stop():
+    for bind in list(sessions):
+        await sessions.pop(bind).kw['bind'].dispose()
+
+
+def session():
+    # read_only views go to the replica like the sync ones (models.RoutingSession)
+    if g.get('read_replica') and 'replica' in sessions:
+        return sessions['replica']()
+    return sessions['primary']()
+
+
+async def fetch(statement):
+    async with session() as s:
+        return (await s.execute(statement)).all()
+
+
+async def fetch_one(statement):
+    async with session() as s:
+        return (await s.execute(statement)).one()
+
+
+async def fetch_first(statement):
+    async with session() as s:
+        return (await s.execute(statement)).first()
+
+
+async def fetch_entity(statement):
+    async with session() as s:
+        return (await s.scalars(statement)).first()
+
+
+async def fetch_entities(statement):
+    async with session() as s:
+        return (await s.scalars(statement)).all()
+
+
+async def venue_detail(venue_id, now, window=None):
+    venue, past, upcoming = await asyncio.gather(
+        fetch_entity(Venue.query.filter(Venue.id == venue_id).statement),
+        fetch(Venue.shows_query(venue_id, now, window, past=True).statement),
+        fetch(Venue.shows_query(venue_id, now, window, past=False).statement))
+    if venue is None:
+        return None
+    return Venue.detail_dict(venue, past + upcoming)
+
+
+async def artist_detail(artist_id, now, window=None):
+    artist, past, upcoming = await asyncio.gather(
+        fetch_entity(Artist.query.filter(Artist.id == artist_id).statement),
+        fetch(Artist.shows_query(artist_id, now, window, past=True).statement),
+        fetch(Artist.shows_query(artist_id, now, window, past=False).statement))
+    if artist is None:
+        return None
+    return Artist.detail_dict(artist, past + upcoming)
+
+
+async def day_counts(window, *criteria):
+    # the calendar for window, or None without one
+    if window is None:
+        return None
+    return dates.calendar(window, await fetch(Show.day_counts_query(window, *criteria).statement))
+
+
+async def search_matches(model, search_term, genres):
+    # the results and their genre facet counts
+    return await asyncio.gather(
+        fetch_entities(search.matching(model, search_term, genres).order_by(model.name, model.id).statement),
+        fetch_one(model.genre_counts_query(search.criteria(model, search_term, genres)).statement))
+
+
+# version functions for cache.conditional, as the sync views use them
+
+async def venue_version(venue_id):
+    return await fetch_first(Venue.version_query(venue_id).statement)
+
+
+async def artist_version(artist_id):
+    return await fetch_first(Artist.version_query(artist_id).statement)
+
+
+async def venues_version():
+    return await fetch_one(Venue.listing_version_query().statement)
+
+
+async def artists_version():
+    return await fetch_one(Artist.listing_version_query().statement)
+
+
+async def shows_version():
+    return await fetch_one(Show.listing_version_query().statement)
+
+
+@read_only
+@cache.conditional(venues_version)
+@cache.cached('venues')
+async def venues():
+    limit = page_size()
+    state = request.args.get('state') or None
+    genres = facets.requested_genres(request.args.getlist('genre'))
+    query = Area.venues_query(Area.parse_cursor(request.args.get('after')), limit, state, genres)
+    rows, counts = await asyncio.gather(
+        fetch(query.statement),
+        fetch_one(Venue.genre_counts_query(Area.venue_filter(state, genres)).statement))
+    rows, next_cursor = paginate(rows, limit, Area.cursor)
+    return render_template('pages/venues.html', areas=Area.directory_dict(rows), next_cursor=next_cursor,
+                           limit=limit, facets=facets.genre_facets(counts, genres), state=state, genres=genres)
+
+
+@read_only
+async def search_venues():
+    search_term = request.args.get('search_term', '')
+    genres = facets.requested_genres(request.args.getlist('genre'))
+    venues, counts = await search_matches(Venue, search_term, genres)
+    data = [venue.dictforvenues() for venue in venues]
+    return render_template('pages/search_venues.html', results={"count": len(data), "data": data},
+                           search_term=search_term, facets=facets.genre_facets(counts, genres))
+
+
+@read_only
+@cache.conditional(dates.windowed(venue_version))
+@cache.cached('venue:{venue_id}')
+async def show_venue(venue_id):
+    window = dates.requested_window(request.args)
+    data, calendar = await asyncio.gather(
+        venue_detail(venue_id, datetime.now(), window),
+        day_counts(window, Show.venue_id == venue_id))
+    if data is None:
+        abort(404)
+    return render_template('pages/show_venue.html', venue=data, window=window, calendar=calendar)
+
+
+@read_only
+@cache.conditional(artists_version)
+@cache.cached('artists')
+async def artists():
+    limit = page_size()
+    genres = facets.requested_genres(request.args.getlist('genre'))
+    query = Artist.page_query(after=request.args.get('after', type=int), limit=limit, genres=genres)
+    rows, counts = await asyncio.gather(
+        fetch(query.statement),
+        fetch_one(Artist.genre_counts_query(Artist.genre_filter(genres)).statement))
+    data, next_cursor = paginate(rows, limit, lambda row: row.id)
+    return render_template('pages/artists.html', artists=data, next_cursor=next_cursor, limit=limit,
+                           facets=facets.genre_facets(counts, genres), genres=genres)
+
+
+@read_only
+async def search_artists():
+    search_term = request.form.get('search_term', '')
+    genres = facets.requested_genres(request.form.getlist('genre'))
+    artists, counts = await search_matches(Artist, search_term, genres)
+    data = [artist.dictforsearchartists() for artist in artists]
+    return render_template('pages/search_artists.html', results={"count": len(data), "data": data},
+                           search_term=search_term, facets=facets.genre_facets(counts, genres))
+
+
+@read_only
+@cache.conditional(dates.windowed(artist_version))
+@cache.cached('artist:{artist_id}')
+async def show_artist(artist_id):
+    window = dates.requested_window(request.args)
+    data, calendar = await asyncio.gather(
+        artist_detail(artist_id, datetime.now(), window),
+        day_counts(window, Show.artist_id == artist_id))
+    if data is None:
+        abort(404)
+    return render_template('pages/show_artist.html', artist=data, window=window, calendar=calendar)
+
+
+@read_only
+@cache.conditional(dates.windowed(shows_version))
+@cache.cached('shows')
+async def shows():
+    limit = page_size()
+    window = dates.requested_window(request.args)
+    query = Show.listing_query(after=Show.parse_cursor(request.args.get('after')), limit=limit, window=window)
+    rows, calendar = await asyncio.gather(fetch(query.statement), day_counts(window))
+    data, next_cursor = paginate(rows, limit, Show.cursor)
+    start_times = format_datetimes([show.start_time for show in data], 'full')
+    return render_template('pages/shows.html', shows=data, start_times=start_times,
+                           next_cursor=next_cursor, limit=limit, window=window, calendar=calendar,
+                           window_args=dates.window_args(request.args))
+
+
+# endpoint -> async view; URL rules and methods stay as app.py has them
+VIEWS = {
+    'venues': venues,
+    'search_venues': search_venues,
+    'show_venue': show_venue,
+    'artists': artists,
+    'search_artists': search_artists,
+    'show_artist': show_artist,
+    'shows': shows,
+}
+
+
+# ----------------------------------------------------------------------------#
+# ASGI application.
+# ----------------------------------------------------------------------------#
+
+def wsgi_environ(scope, body):
+    # the WSGI environ Flask's request context is built from
+    server = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf8').decode('latin1'),
+        'PATH_INFO': scope['path'].encode('utf8').decode('latin1'),
+        'QUERY_STRING': scope['query_string'].decode('latin1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': 'HTTP/' + scope.get('http_version', '1.1'),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': False,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    if scope.get('client'):
+        environ['REMOTE_ADDR'] = scope['client'][0]
+    for name, value in scope['headers']:
+        name = name.decode('latin1').upper().replace('-', '_')
+        value = value.decode('latin1')
+        if name == 'CONTENT_LENGTH':
+            continue  # the body is already buffered, its length is known
+        key = name if name == 'CONTENT_TYPE' else 'HTTP_' + name
+        environ[key] = environ[key] + ',' + value if key in environ else value
+    return environ
+
+
+async def read_body(receive):
+    body = b''
+    more = True
+    while more:
+        message = await receive()
+        body += message.get('body', b'')
+        more = message.get('more_body', False)
+    return body
+
+
+class AsyncApp:
+    # serves VIEWS natively and passes anything else to fallback (the same
+    # Flask app wrapped by asgiref's WsgiToAsgi)
+
+    def __init__(self, app, fallback):
+        self.app = app
+        self.fallback = fallback
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self.lifespan(receive, send)
+        if scope['type'] == 'http':
+            view = self.match(scope)
+            if view is not None:
+                return await self.dispatch(view, scope, receive, send)
+        return await self.fallback(scope, receive, send)
+
+    def match(self, scope):
+        adapter = self.app.url_map.bind_to_environ(wsgi_environ(scope, b''))
+        try:
+            endpoint, _ = adapter.match()
+        except HTTPException:
+            return None
+        return VIEWS.get(endpoint)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                self.startup()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await stop()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    def startup(self):
+        if sessions:
+            return
+        start(self.app)
+        # search.has_fts() looks its answer up once per process; do it here
+        # rather than synchronously inside a request
+        with self.app.app_context():
+            if db.engine.dialect.name == 'sqlite':
+                for model in (Artist, Venue):
+                    search.has_fts(model.__tablename__)
+
+    async def dispatch(self, view, scope, receive, send):
+        # Flask's full_dispatch_request(), awaiting the view instead of
+        # running it on a private event loop
+        self.startup()
+        app = self.app
+        with app.request_context(wsgi_environ(scope, await read_body(receive))):
+            try:
+                try:
+                    rv = app.preprocess_request()
+                    if rv is None:
+                        rv = await view(**request.view_args)
+                except Exception as e:
+                    rv = app.handle_user_exception(e)
+                response = app.process_response(app.make_response(rv))
+            except Exception as e:
+                response = app.make_response(app.handle_exception(e))
+            body = b'' if scope['method'] == 'HEAD' else b''.join(response.iter_encoded())
+            await send({
+                'type': 'http.response.start',
+                'status': response.status_code,
+                'headers': [(name.lower().encode('latin1'), value.encode('latin1'))
+                            for name, value in response.headers.items()],
+            })
+            await send({'type': 'http.response.body', 'body': body})
+            response.close()
@@ -0,0 +1,228 @@
+import json
+from datetime import datetime
+
+from flask import Blueprint, Response, g, request
+from sqlalchemy import tuple_
+
+from models import Artist, Show, Venue, db, mask_genres, page_size, paginate, replica_ok
+import search
+
+# ----------------------------------------------------------------------------#
+# JSON API (v1).
+#
+# Mirrors the HTML routes for artists, venues and shows. ?fields= picks the
+# columns to return and only those are selected; lists are keyset paginated
+# with ?limit= and ?after= like the HTML listings.
+# ----------------------------------------------------------------------------#
+
+api = Blueprint('api', __name__, url_prefix='/api/v1')
+
+
+@api.before_request
+def use_read_replica():
+    # every endpoint here is a read (see models.read_only)
+    g.read_replica = replica_ok()
+
+
+# field name -> column expression
+ARTIST_FIELDS = {
+    "id": Artist.id,
+    "name": Artist.name,
+    "city": Artist.city,
+    "state": Artist.state,
+    "phone": Artist.phone,
+    "image_link": Artist.image_link,
+    "facebook_link": Artist.facebook_link,
+    "website": Artist.website,
+    "seeking_venue": Artist.seeking_venue,
+    "seeking_description": Artist.seeking_description,
+    "genres": Artist.genre_mask,
+    "upcoming_shows_count": Artist.upcoming_shows_count,
+    "past_shows_count": Artist.past_shows_count,
+}
+
+VENUE_FIELDS = {
+    "id": Venue.id,
+    "name": Venue.name,
+    "city": Venue.city,
+    "state": Venue.state,
+    "address": Venue.address,
+    "phone": Venue.phone,
+    "image_link": Venue.image_link,
+    "facebook_link": Venue.facebook_link,
+    "website": Venue.website,
+    "seeking_talent": Venue.seeking_talent,
+    "seeking_description": Venue.seeking_description,
+    "genres": Venue.genre_mask,
+    "upcoming_shows_count": Venue.upcoming_shows_count,
+    "past_shows_count": Venue.past_shows_count,
+}
+
+SHOW_FIELDS = {
+    "show_id": Show.show_id,
+    "artist_id": Show.artist_id,
+    "venue_id": Show.venue_id,
+    "start_time": Show.start_time,
+    "artist_name": Artist.name,
+    "artist_image_link": Artist.image_link,
+    "venue_name": Venue.name,
+    "venue_image_link": Venue.image_link,
+}
+
+# genres and show counts are only returned when asked for
+OPTIONAL_FIELDS = ('genres', 'upcoming_shows_count', 'past_shows_count')
+
+DEFAULT_FIELDS = {
+    'artists': [name for name in ARTIST_FIELDS if name not in OPTIONAL_FIELDS],
+    'venues': [name for name in VENUE_FIELDS if name not in OPTIONAL_FIELDS],
+    'shows': ['show_id', 'artist_id', 'venue_id', 'start_time'],
+}
+
+
+class FieldError(ValueError):
+    pass
+
+
+def serialize(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def respond(payload, status=200):
+    return Response(json.dumps(payload, separators=(',', ':'), default=serialize),
+                    status=status, mimetype='application/json')
+
+
+def error(status, message):
+    return respond({"error": message}, status)
+
+
+def requested_fields(kind, fields):
+    value = request.args.get('fields')
+    if not value:
+        return DEFAULT_FIELDS[kind]
+    names = list(dict.fromkeys(name.strip() for name in value.split(',') if name.strip()))
+    unknown = [name for name in names if name not in fields]
+    if unknown or not names:
+        raise FieldError(f"unknown fields: {', '.join(unknown)}; allowed: {', '.join(fields)}")
+    return names
+
+
+def entity_query(model, fields, names):
+    # the requested columns plus the key used for the cursor
+    columns = [model.id.label('_key')]
+    for name in names:
+        columns.append(fields[name].label(name))
+    return db.session.query(*columns).select_from(model)
+
+
+def show_query(names):
+    query = db.session.query(Show.start_time.label('_start_time'), Show.show_id.label('_key'),
+                             *[SHOW_FIELDS[name].label(name) for name in names]).select_from(Show)
+    if any(name.startswith('artist_') and name != 'artist_id' for name in names):
+        query = query.join(Artist, Show.artist_id == Artist.id)
+    if any(name.startswith('venue_') and name != 'venue_id' for name in names):
+        query = query.join(Venue, Show.venue_id == Venue.id)
+    return query
+
+
+def to_dict(row, names):
+    item = {name: getattr(row, name) for name in names}
+    if 'genres' in item:
+        item['genres'] = mask_genres(item['genres'])
+    return item
+
+
+def entity_page(query, key, names):
+    limit = page_size()
+    after = request.args.get('after', type=int)
+    if after is not None:
+        query = query.filter(key > after)
+    rows = query.order_by(key).limit(limit + 1).all()
+    rows, next_cursor = paginate(rows, limit, lambda row: row._key)
+    return respond({"data": [to_dict(row, names) for row in rows], "next": next_cursor})
+
+
+def show_page(query, names):
+    # the (start_time, show_id) cursor has no place for a show without a
+    # start time, so the listings leave those out; the detail route does not
+    limit = page_size()
+    query = query.filter(Show.start_time.isnot(None))
+    after = Show.parse_cursor(request.args.get('after'))
+    if after is not None:
+        query = query.filter(tuple_(Show.start_time, Show.show_id) > tuple_(*after))
+    rows = query.order_by(Show.start_time, Show.show_id).limit(limit + 1).all()
+    rows, next_cursor = paginate(rows, limit, lambda row: Show.make_cursor(row._start_time, row._key))
+    return respond({"data": [to_dict(row, names) for row in rows], "next": next_cursor})
+
+
+def entity_routes(kind, model, fields):
+    def index():
+        try:
+            names = requested_fields(kind, fields)
+        except FieldError as e:
+            return error(400, str(e))
+        return entity_page(entity_query(model, fields, names), model.id, names)
+
+    def detail(entity_id):
+        try:
+            names = requested_fields(kind, fields)
+        except FieldError as e:
+            return error(400, str(e))
+        row = entity_query(model, fields, names).filter(model.id == entity_id).first()
+        if row is None:
+            return error(404, f"{kind[:-1]} {entity_id} not found")
+        return respond({"data": to_dict(row, names)})
+
+    def search_view():
+        try:
+            names = requested_fields(kind, fields)
+        except FieldError as e:
+            return error(400, str(e))
+        matches = search.matching(model, request.args.get('q', '')).with_entities(model.id)
+        query = entity_query(model, fields, names).filter(model.id.in_(matches))
+        return entity_page(query, model.id, names)
+
+    api.add_url_rule(f'/{kind}', f'{kind}_index', index)
+    api.add_url_rule(f'/{kind}/<int:entity_id>', f'{kind}_detail', detail)
+    api.add_url_rule(f'/{kind}/search', f'{kind}_search', search_view)
+
+
+entity_routes('artists', Artist, ARTIST_FIELDS)
+entity_routes('venues', Venue, VENUE_FIELDS)
+
+
+@api.route('/shows')
+def shows_index():
+    try:
+        names = requested_fields('shows', SHOW_FIELDS)
+    except FieldError as e:
+        return error(400, str(e))
+    return show_page(show_query(names), names)
+
+
+@api.route('/shows/<int:show_id>')
+def shows_detail(show_id):
+    try:
+        names = requested_fields('shows', SHOW_FIELDS)
+    except FieldError as e:
+        return error(400, str(e))
+    row = show_query(names).filter(Show.show_id == show_id).first()
+    if row is None:
+        return error(404, f"show {show_id} not found")
+    return respond({"data": to_dict(row, names)})
+
+
+@api.route('/shows/search')
+def shows_search():
+    # shows whose artist or venue matches ?q=
+    try:
+        names = requested_fields('shows', SHOW_FIELDS)
+    except FieldError as e:
+        return error(400, str(e))
+    term = request.args.get('q', '')
+    artists = search.matching(Artist, term).with_entities(Artist.id)
+    venues = search.matching(Venue, term).with_entities(Venue.id)
+    query = show_query(names).filter(Show.artist_id.in_(artists) | Show.venue_id.in_(venues))
+    return show_page(query, names)
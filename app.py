@@ -4,61 +4,91 @@
 
 import json
 import sys
+from datetime import datetime
 
-import dateutil.parser
-import babel
-from flask import Flask, render_template, request, Response, flash, redirect, url_for, jsonify, abort
+from flask import Flask, render_template, stream_template, stream_with_context, request, Response, flash, redirect, url_for, jsonify, abort
 from flask_moment import Moment
-from sqlalchemy import func
+from jinja2 import TemplateSyntaxError
+from sqlalchemy.orm import configure_mappers
 
 
 import logging
 from logging import Formatter, FileHandler
 
-from forms import *
+from forms import ArtistForm, ShowForm, VenueForm
+from filters import DATETIME_FORMATS, datetime_formatter, format_datetime, format_datetimes
+from models import Area, Venue, Artist, Show, db, migrate, page_size, read_only, remember_write
+from api import api
+import cache
+import catalog
+import dates
+import facets
+import jobs
+import metrics
+import search
 
 
 # ----------------------------------------------------------------------------#
 # App Config.
-# ---------------------------------------------------------------------------
-app = Flask(__name__)
-moment = Moment(app)
-app.config.from_object('config')
-
-
-
-
-
-
-
-
-
-
-
-# ----------------------------------------------------------------------------#
-# Filters.
 # ----------------------------------------------------------------------------#
 
-def format_datetime(value, format='medium'):
-    if value is None or value == "":
-        return ""
-    date = dateutil.parser.parse(str(value))
-    if format == 'full':
-        format = "EEEE MMMM, d, y 'at' h:mma"
-    elif format == 'medium':
-        format = "EE MM, dd, y h:mma"
-    return babel.dates.format_datetime(date, format, locale='en')
-
-from models import Venue, Artist, Show, Artist_Genres, Venue_Genres, db
-
-app.jinja_env.filters['datetime'] = format_datetime
+moment = Moment()
+
+# the controllers below are collected here and added to every app that
+# create_app() builds, each under its function name as the endpoint
+views = []
+
+
+def route(rule, **options):
+    def decorator(view):
+        views.append((rule, view, options))
+        return view
+    return decorator
+
+
+def create_app(config=None):
+    # config: settings applied over config.py (tests, benchmarks)
+    app = Flask(__name__)
+    app.config.from_object('config')
+    if config:
+        app.config.update(config)
+    moment.init_app(app)
+    db.init_app(app)
+    migrate.init_app(app, db)
+    app.after_request(remember_write)
+    cache.init_app(app)
+    catalog.init_app(app)
+    jobs.init_app(app)
+    metrics.init_app(app)
+    app.register_blueprint(api)
+    for rule, view, options in views:
+        app.add_url_rule(rule, view_func=view, **options)
+    app.register_error_handler(404, not_found_error)
+    app.register_error_handler(500, server_error)
+    app.jinja_env.filters['datetime'] = format_datetime
+    if not app.debug:
+        log_errors(app)
+    return app
+
+
+def warm(app):
+    # everything a first request would otherwise pay for; the entry points
+    # (wsgi.py, asgi.py) call it once per process before serving
+    configure_mappers()
+    for name in app.jinja_env.list_templates(extensions=['html']):
+        try:
+            app.jinja_env.get_template(name)
+        except TemplateSyntaxError as e:
+            app.logger.warning('template %s: %s', name, e)
+    for format in DATETIME_FORMATS:
+        datetime_formatter(format, 'en')
 
 
 # ----------------------------------------------------------------------------#
 # Controllers.
 # ----------------------------------------------------------------------------#
 
-@app.route('/')
+@route('/')
 def index():
     return render_template('pages/home.html')
 
@@ -66,30 +96,27 @@ def index():
 #  Venues
 #  ----------------------------------------------------------------
 
-@app.route('/venues')
+@route('/venues')
+@read_only
+@cache.conditional(lambda: Venue.listing_version())
+@cache.cached('venues')
 def venues():
-    areas = Venue.query.with_entities(func.count(Venue.id),
-                                      Venue.city,
-                                      Venue.state
-                                      ).group_by(Venue.city, Venue.state).all()
-    data = []
-    for area in areas:
-        area_venues = Venue.query.filter_by(state=area.state).filter_by(city=area.city).all()
-        venue_data = []
-        for venue in area_venues:
-            venue_data.append(venue.dictforvenues())
-        data.append({
-            "city": area.city,
-            "state": area.state,
-            "venues": venue_data
-        })
-    return render_template('pages/venues.html', areas=data);
-
-
-@app.route('/venues/search', methods=['GET'])
+    limit = page_size()
+    state = request.args.get('state') or None
+    genres = facets.requested_genres(request.args.getlist('genre'))
+    data, next_cursor = Area.directory(after=Area.parse_cursor(request.args.get('after')), limit=limit,
+                                       state=state, genres=genres)
+    counts = Venue.genre_counts_query(Area.venue_filter(state, genres)).one()
+    return render_template('pages/venues.html', areas=data, next_cursor=next_cursor, limit=limit,
+                           facets=facets.genre_facets(counts, genres), state=state, genres=genres)
+
+
+@route('/venues/search', methods=['GET'])
+@read_only
 def search_venues():
-    search_term = request.args.get('search_term')
-    res = Venue.query.filter(Venue.name.like(f'%{search_term}%')).all()
+    search_term = request.args.get('search_term', '')
+    genres = facets.requested_genres(request.args.getlist('genre'))
+    res = search.search_venues(search_term, genres)
     data = []
     for venue in res:
         data.append(venue.dictforvenues())
@@ -97,61 +124,34 @@ def search_venues():
         "count": len(data),
         "data": data
     }
+    counts = Venue.genre_counts_query(search.criteria(Venue, search_term, genres)).one()
     return render_template('pages/search_venues.html', results=response,
-                           search_term=search_term)
+                           search_term=search_term, facets=facets.genre_facets(counts, genres))
 
 
-@app.route('/venues/<int:venue_id>')
+@route('/venues/<int:venue_id>')
+@read_only
+@cache.conditional(dates.windowed(lambda venue_id: Venue.version(venue_id)))
+@cache.cached('venue:{venue_id}')
 def show_venue(venue_id):
-    # shows the venue page with the given venue_id
-    # TODO: replace with real venue data from the venues table, using venue_id
-
-    shows_list = []
-    shows_list = db.session.query(Show).join(Venue).filter(Venue.id == venue_id).all()
-    past_shows = db.session.query(Show).join(Venue).filter(Venue.id == venue_id) \
-        .filter(Show.start_time < datetime.now()).all()
-    upcoming_shows = db.session.query(Show).join(Venue).filter(Venue.id == venue_id) \
-        .filter(Show.start_time >= datetime.now()).all()
-    for show in past_shows:
-        show = show.dictforartists()
-    for show in upcoming_shows:
-        show = show.dictforartists()
-    this_venue = Venue.query.get(venue_id)
-    genres_list = []
-    genres = Venue_Genres.query.with_entities(Venue_Genres.genre).filter_by(venue_id=venue_id).all()
-    for genre in genres:
-        genres_list.append(genre.genre)
-    data = {
-        "id": venue_id,
-        "name": this_venue.name,
-        "genres": genres_list,
-        "address": this_venue.address,
-        "city": this_venue.city,
-        "state": this_venue.state,
-        "phone": this_venue.phone,
-        "website": this_venue.website,
-        "facebook_link": this_venue.facebook_link,
-        "seeking_talent": this_venue.seeking_talent,
-        "seeking_description": this_venue.seeking_description,
-        "image_link": this_venue.image_link,
-        "past_shows": past_shows,
-        "upcoming_shows": upcoming_shows,
-        "past_shows_count": len(past_shows),
-        "upcoming_shows_count": len(upcoming_shows),
-    }
-    return render_template('pages/show_venue.html', venue=data)
+    window = dates.requested_window(request.args)
+    data = Venue.detail(venue_id, now=datetime.now(), window=window)
+    if data is None:
+        abort(404)
+    calendar = dates.calendar(window, Show.day_counts_query(window, Show.venue_id == venue_id).all()) if window else None
+    return render_template('pages/show_venue.html', venue=data, window=window, calendar=calendar)
 
 
 #  Create Venue
 #  ----------------------------------------------------------------
 
-@app.route('/venues/create', methods=['GET'])
+@route('/venues/create', methods=['GET'])
 def create_venue_form():
     form = VenueForm()
     return render_template('forms/new_venue.html', form=form)
 
 
-@app.route('/venues/create', methods=['POST'])
+@route('/venues/create', methods=['POST'])
 def create_venue_submission():
     error = False
     try:
@@ -187,14 +187,12 @@ def create_venue_submission():
             raise Exception
         v = Venue(name=name, city=city, state=state, address=address, phone=phone, facebook_link=facebook_link,
                   image_link=image_link, website=website, seeking_talent=seeking_talent,
-                  seeking_description=seeking_description)
+                  seeking_description=seeking_description, genres=genres)
         db.session.add(v)
+        db.session.flush()
+        venue_id = v.id
+        Area.refresh([(state, city)])
         db.session.commit()
-        for genre in genres:
-            vg = Venue_Genres(venue_id=v.id, genre=genre)
-            db.session.add(vg)
-            db.session.commit()
-
     except:
         error = True
         db.session.rollback()
@@ -204,16 +202,21 @@ def create_venue_submission():
     if error:
         flash('Venue ' + request.form['name'] + ' was not listed due to an error!')
     else:
+        cache.invalidate_venue(venue_id, artist_ids=[])
         flash('Venue ' + request.form['name'] + ' was successfully listed!')
         return render_template('pages/home.html')
 
 
-@app.route('/venues/<venue_id>', methods=['DELETE'])
+@route('/venues/<venue_id>', methods=['DELETE'])
 def delete_venue(venue_id):
     error = False
     try:
         this_venue = Venue.query.get(venue_id)
+        artist_ids = Venue.artist_ids(this_venue.id)
+        area = (this_venue.state, this_venue.city)
         db.session.delete(this_venue)
+        Artist.touch(artist_ids)
+        Area.refresh([area])
         db.session.commit()
     except:
         error = True
@@ -224,27 +227,32 @@ def delete_venue(venue_id):
     if error:
         abort(500)
     else:
+        cache.invalidate_venue(venue_id, artist_ids=artist_ids)
         return render_template('pages/home.html')
 
 
 #  Artists
 #  ----------------------------------------------------------------
-@app.route('/artists')
+@route('/artists')
+@read_only
+@cache.conditional(lambda: Artist.listing_version())
+@cache.cached('artists')
 def artists():
-    arts = Artist.query.all()
-    data = []
-    for artist in arts:
-        data.append(artist.dictforartists())
-    return render_template('pages/artists.html', artists=data)
+    limit = page_size()
+    genres = facets.requested_genres(request.args.getlist('genre'))
+    data, next_cursor = Artist.page(after=request.args.get('after', type=int), limit=limit, genres=genres)
+    counts = Artist.genre_counts_query(Artist.genre_filter(genres)).one()
+    return render_template('pages/artists.html', artists=data, next_cursor=next_cursor, limit=limit,
+                           facets=facets.genre_facets(counts, genres), genres=genres)
 
 
-@app.route('/artists/search', methods=['POST'])
+@route('/artists/search', methods=['POST'])
+@read_only
 def search_artists():
-    # TODO: implement search on artists with partial string search. Ensure it is case-insensitive.
-    # seach for "A" should return "Guns N Petals", "Matt Quevado", and "The Wild Sax Band".
-    # search for "band" should return "The Wild Sax Band".
+    # partial, case-insensitive match on name, city and state
     search_term = request.form.get('search_term', '')
-    res = Artist.query.filter(Artist.name.like(f'%{search_term}%')).all()
+    genres = facets.requested_genres(request.form.getlist('genre'))
+    res = search.search_artists(search_term, genres)
     data = []
     for artist in res:
         data.append(artist.dictforsearchartists())
@@ -252,58 +260,31 @@ def search_artists():
         "count": len(data),
         "data": data
     }
+    counts = Artist.genre_counts_query(search.criteria(Artist, search_term, genres)).one()
 
     return render_template('pages/search_artists.html', results=response,
-                           search_term=search_term)
+                           search_term=search_term, facets=facets.genre_facets(counts, genres))
 
 
-@app.route('/artists/<int:artist_id>')
+@route('/artists/<int:artist_id>')
+@read_only
+@cache.conditional(dates.windowed(lambda artist_id: Artist.version(artist_id)))
+@cache.cached('artist:{artist_id}')
 def show_artist(artist_id):
-    this_artist = Artist.query.get(artist_id)
-    artist_shows = Show.query.filter_by(artist_id=artist_id).all()
-    past_shows = db.session.query(Show).join(Artist).filter(Artist.id == artist_id) \
-        .filter(Show.start_time < datetime.now()).all()
-    upcoming_shows = db.session.query(Show).join(Artist).filter(Artist.id == artist_id) \
-        .filter(Show.start_time >= datetime.now()).all()
-    for show in past_shows:
-        show = show.dictforartists()
-    for show in upcoming_shows:
-        show = show.dictforartists()
-    genres_list = []
-    genres = Artist_Genres.query.with_entities(Artist_Genres.genre).filter_by(artist_id=artist_id).all()
-    for genre in genres:
-        genres_list.append(genre.genre)
-    data = {
-        "id": this_artist.id,
-        "name": this_artist.name,
-        "genres": genres_list,
-        "city": this_artist.city,
-        "state": this_artist.state,
-        "phone": this_artist.phone,
-        "website": this_artist.website,
-        "facebook_link": this_artist.facebook_link,
-        "seeking_venue": this_artist.seeking_venue,
-        "seeking_description": this_artist.seeking_description,
-        "image_link": this_artist.image_link,
-        "past_shows": past_shows,
-        "upcoming_shows": upcoming_shows,
-        "past_shows_count": len(past_shows),
-        "upcoming_shows_count": len(upcoming_shows),
-    }
-    return render_template('pages/show_artist.html', artist=data)
+    window = dates.requested_window(request.args)
+    data = Artist.detail(artist_id, now=datetime.now(), window=window)
+    if data is None:
+        abort(404)
+    calendar = dates.calendar(window, Show.day_counts_query(window, Show.artist_id == artist_id).all()) if window else None
+    return render_template('pages/show_artist.html', artist=data, window=window, calendar=calendar)
 
 
 #  Update
 #  ----------------------------------------------------------------
-@app.route('/artists/<int:artist_id>/edit', methods=['GET'])
+@route('/artists/<int:artist_id>/edit', methods=['GET'])
 def edit_artist(artist_id):
     this_artist = Artist.query.get(artist_id)
     if this_artist:
-        genres_list = []
-        genres = Artist_Genres.query.with_entities(Artist_Genres.genre).filter_by(artist_id=artist_id).all()
-        for genre in genres:
-            genres_list.append(genre.genre)
-
         form = ArtistForm()
         form.name.data = this_artist.name
         form.city.data = this_artist.city
@@ -313,20 +294,16 @@ def edit_artist(artist_id):
         form.image_link.data = this_artist.image_link
         form.seeking_description.data = this_artist.seeking_description
         form.facebook_link.data = this_artist.facebook_link
-        form.genres.data = genres_list
+        form.genres.data = this_artist.genres
         form.seeking_venue.data = this_artist.seeking_venue
     else:
         abort(404)
     return render_template('forms/edit_artist.html', form=form, artist=this_artist)
 
 
-@app.route('/artists/<int:artist_id>/edit', methods=['POST'])
+@route('/artists/<int:artist_id>/edit', methods=['POST'])
 def edit_artist_submission(artist_id):
     this_artist = Artist.query.get(artist_id)
-    old_genres = Artist_Genres.query.with_entities(Artist_Genres.genre).filter_by(artist_id=artist_id).all()
-    old_genres_list = []
-    for old_genre in old_genres:
-        old_genres_list.append(old_genre.genre)
     error = False
     try:
         new_genres = request.form.getlist('genres')
@@ -357,39 +334,28 @@ def edit_artist_submission(artist_id):
         af.seeking_description.data = this_artist.seeking_description
         if not af.validate():
             raise Exception
+        this_artist.genres = new_genres
         db.session.add(this_artist)
+        Artist.touch([artist_id])
+        Venue.touch(Artist.venue_ids(artist_id))
         db.session.commit()
-        for new_genre in new_genres:
-            ag = Artist_Genres.query.filter_by(artist_id=artist_id).filter_by(genre=new_genre).first()
-            if ag is None:
-                ag = Artist_Genres(artist_id=artist_id, genre=new_genre)
-                db.session.add(ag)
-                db.session.commit()
-        for old_genre in old_genres_list:
-            if old_genre not in new_genres:
-                agd = Artist_Genres.query.filter_by(artist_id=artist_id).filter_by(genre=old_genre).first()
-                db.session.delete(agd)
-                db.session.commit()
     except:
         error = True
         db.session.rollback()
         print(sys.exc_info())
     finally:
         db.session.close()
-
+    if not error:
+        cache.invalidate_artist(artist_id)
     return redirect(url_for('show_artist', artist_id=artist_id))
 
 
-@app.route('/venues/<int:venue_id>/edit', methods=['GET'])
+@route('/venues/<int:venue_id>/edit', methods=['GET'])
 def edit_venue(venue_id):
     this_venue = Venue.query.get(venue_id)
     if this_venue:
-        genres_list = []
-        genres = Venue_Genres.query.with_entities(Venue_Genres.genre).filter_by(venue_id=venue_id).all()
-        for genre in genres:
-            genres_list.append(genre.genre)
         form = VenueForm()
-        form.genres.data = genres_list
+        form.genres.data = this_venue.genres
         form.seeking_talent.data = this_venue.seeking_talent
         form.name.data = this_venue.name
         form.city.data = this_venue.city
@@ -400,19 +366,15 @@ def edit_venue(venue_id):
         form.image_link.data = this_venue.image_link
         form.seeking_description.data = this_venue.seeking_description
         form.facebook_link.data = this_venue.facebook_link
-        form.genres.data = genres_list
         return render_template('forms/edit_venue.html', form=form, venue=this_venue)
     else:
         abort(404)
 
 
-@app.route('/venues/<int:venue_id>/edit', methods=['POST'])
+@route('/venues/<int:venue_id>/edit', methods=['POST'])
 def edit_venue_submission(venue_id):
     this_venue = Venue.query.get(venue_id)
-    old_genres = Venue_Genres.query.with_entities(Venue_Genres.genre).filter_by(venue_id=venue_id).all()
-    old_genres_list = []
-    for old_genre in old_genres:
-        old_genres_list.append(old_genre.genre)
+    old_area = (this_venue.state, this_venue.city)
     error = False
     try:
         new_genres = request.form.getlist('genres')
@@ -445,19 +407,13 @@ def edit_venue_submission(venue_id):
         vf.genres.data = new_genres
         if not vf.validate():
             raise Exception
+        this_venue.genres = new_genres
         db.session.add(this_venue)
+        if (this_venue.state, this_venue.city) != old_area:
+            Area.refresh([old_area, (this_venue.state, this_venue.city)])
+        Venue.touch([venue_id])
+        Artist.touch(Venue.artist_ids(venue_id))
         db.session.commit()
-        for genre in new_genres:
-            vg = Venue_Genres.query.filter_by(venue_id=venue_id).filter_by(genre=genre).first()
-            if vg is None:
-                vg = Venue_Genres(venue_id=venue_id, genre=genre)
-                db.session.add(vg)
-                db.session.commit()
-        for old_genre in old_genres_list:
-            if old_genre not in new_genres:
-                vgd = Venue_Genres.query.filter_by(venue_id=venue_id).filter_by(genre=old_genre).first()
-                db.session.delete(vgd)
-                db.session.commit()
     except:
         error = True
         db.session.rollback()
@@ -467,19 +423,20 @@ def edit_venue_submission(venue_id):
     if error:
         abort(500)
     else:
+        cache.invalidate_venue(venue_id)
         return redirect(url_for('show_venue', venue_id=venue_id))
 
 
 #  Create Artist
 #  ----------------------------------------------------------------
 
-@app.route('/artists/create', methods=['GET'])
+@route('/artists/create', methods=['GET'])
 def create_artist_form():
     form = ArtistForm()
     return render_template('forms/new_artist.html', form=form)
 
 
-@app.route('/artists/create', methods=['POST'])
+@route('/artists/create', methods=['POST'])
 def create_artist_submission():
     error = False
     try:
@@ -514,13 +471,11 @@ def create_artist_submission():
             raise Exception
         a = Artist(name=name, city=city, state=state, phone=phone, facebook_link=facebook_link,
                    image_link=image_link, website=website, seeking_venue=seeking_venue,
-                   seeking_description=seeking_description)
+                   seeking_description=seeking_description, genres=genres)
         db.session.add(a)
+        db.session.flush()
+        artist_id = a.id
         db.session.commit()
-        for genre in genres:
-            ag = Artist_Genres(artist_id=a.id, genre=genre)
-            db.session.add(ag)
-            db.session.commit()
     except:
         error = True
         db.session.rollback()
@@ -530,6 +485,7 @@ def create_artist_submission():
     if error:
         flash('Artist ' + request.form['name'] + ' was not listed due to an error!')
     else:
+        cache.invalidate_artist(artist_id, venue_ids=[])
         flash('Artist ' + request.form['name'] + ' was successfully listed!')
         return render_template('pages/home.html')
 
@@ -537,25 +493,31 @@ def create_artist_submission():
 #  Shows
 #  ----------------------------------------------------------------
 
-@app.route('/shows')
+@route('/shows')
+@read_only
+@cache.conditional(dates.windowed(lambda: Show.listing_version()))
 def shows():
-    # displays list of shows at /shows
-    # TODO: replace with real venues data.
-    shows_list = Show.query.all()
-    data = []
-    for show in shows_list:
-        data.append(show.dictforshows())
-    return render_template('pages/shows.html', shows=data)
-
-
-@app.route('/shows/create')
+    # displays list of shows at /shows; streamed, so only the ETag applies
+    # (see cache.cached)
+    limit = page_size()
+    window = dates.requested_window(request.args)
+    data, next_cursor = Show.listing(after=Show.parse_cursor(request.args.get('after')), limit=limit,
+                                     window=window)
+    start_times = format_datetimes([show.start_time for show in data], 'full')
+    calendar = dates.calendar(window, Show.day_counts_query(window).all()) if window else None
+    return stream_template('pages/shows.html', shows=data, start_times=start_times,
+                           next_cursor=next_cursor, limit=limit, window=window, calendar=calendar,
+                           window_args=dates.window_args(request.args))
+
+
+@route('/shows/create')
 def create_shows():
     # renders form. do not touch.
     form = ShowForm()
     return render_template('forms/new_show.html', form=form)
 
 
-@app.route('/shows/create', methods=['POST'])
+@route('/shows/create', methods=['POST'])
 def create_show_submission():
     error = False
     try:
@@ -568,8 +530,11 @@ def create_show_submission():
         sf.start_time.data = start_time
         if not sf.validate():
             raise Exception
+        start_time = datetime.fromisoformat(start_time)
         s = Show(artist_id=artist_id, venue_id=venue_id, start_time=start_time)
         db.session.add(s)
+        # bumps the artist's and venue's show counters and touches both
+        Show.count_new([(artist_id, venue_id, start_time)])
         db.session.commit()
     except:
         error = True
@@ -580,21 +545,35 @@ def create_show_submission():
     if error:
         flash('Show was not listed due to an error!')
     else:
+        cache.invalidate_show(artist_id, venue_id)
         flash('Show was successfully listed!')
         return render_template('pages/home.html')
 
 
-@app.errorhandler(404)
+#  Export
+#  ----------------------------------------------------------------
+
+@route('/export/<kind>.<fmt>')
+def export_catalog(kind, fmt):
+    if kind not in catalog.EXPORTS or fmt not in catalog.MIMETYPES:
+        abort(404)
+    return Response(stream_with_context(catalog.export_lines(kind, fmt)),
+                    mimetype=catalog.MIMETYPES[fmt])
+
+
 def not_found_error(error):
     return render_template('errors/404.html'), 404
 
 
-@app.errorhandler(500)
 def server_error(error):
     return render_template('errors/500.html'), 500
 
 
-if not app.debug:
+def log_errors(app):
+    # app.logger is shared by every app built in this process; add the
+    # handler once
+    if any(isinstance(handler, FileHandler) for handler in app.logger.handlers):
+        return
     file_handler = FileHandler('error.log')
     file_handler.setFormatter(
         Formatter('%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]')
@@ -608,13 +587,8 @@ if not app.debug:
 # Launch.
 # ----------------------------------------------------------------------------#
 
-# Default port:
-if __name__ == '__main__':
-    app.run()
-
-# Or specify port manually:
-'''
+# Development server; in production run the WSGI entry point instead:
+#   gunicorn -c gunicorn.conf.py  (see wsgi.py)
+# The flask command (FLASK_APP=app) finds create_app() on its own.
 if __name__ == '__main__':
-    port = int(os.environ.get('PORT', 5000))
-    app.run(host='0.0.0.0', port=port)
-'''
+    create_app().run()
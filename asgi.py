@@ -0,0 +1,20 @@
+# ASGI entry point: the listing, detail and search pages are served as
+# coroutines on the server's event loop with pooled async database
+# connections (aio.py); forms, writes, the API and exports go to the
+# regular WSGI app through asgiref. Run with any ASGI server, e.g.
+#
+#   uvicorn asgi:application --workers 4
+#
+# Needs the async driver for the database: asyncpg for Postgres, aiosqlite
+# for SQLite. One worker keeps many of these requests in flight at once,
+# each waiting on its own connection from the pool (DB_POOL_SIZE +
+# DB_MAX_OVERFLOW per bind).
+from asgiref.wsgi import WsgiToAsgi
+
+from app import create_app, warm
+import aio
+
+app = create_app()
+warm(app)
+
+application = aio.AsyncApp(app, WsgiToAsgi(app))
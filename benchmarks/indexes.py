@@ -0,0 +1,112 @@
+"""Query plans and timings for the hot read paths, without and with the
+indexes added in migration c3a8f1e6b2d7.
+
+    python -m benchmarks.indexes --venues 2000 --artists 5000 --shows 200000
+
+Runs against a throwaway SQLite file unless --database-url points at an
+(empty) Postgres database.
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+from sqlalchemy import create_engine, text
+
+from benchmarks.seed import create_schema, seed
+from models import GENRE_BITS, db
+
+QUERIES = {
+    'venue detail shows': (
+        "SELECT shows.start_time, artists.name FROM shows "
+        "JOIN artists ON artists.id = shows.artist_id "
+        "WHERE shows.venue_id = :venue_id ORDER BY shows.start_time"),
+    'artist detail shows': (
+        "SELECT shows.start_time, venues.name FROM shows "
+        "JOIN venues ON venues.id = shows.venue_id "
+        "WHERE shows.artist_id = :artist_id ORDER BY shows.start_time"),
+    'upcoming counts (page of venues)': (
+        "SELECT venue_id, count(show_id) FROM shows "
+        "WHERE venue_id BETWEEN :venue_id AND :venue_id + 49 AND start_time >= :now "
+        "GROUP BY venue_id"),
+    'shows keyset page': (
+        "SELECT show_id, start_time FROM shows "
+        "WHERE start_time >= :now ORDER BY start_time, show_id LIMIT 50"),
+    'venues in area': (
+        "SELECT id, name FROM venues WHERE state = :state AND city = :city"),
+    'venues by genre': (
+        "SELECT id FROM venues WHERE genre_mask & :genre_bit <> 0"),
+}
+
+
+def explain(connection, sql, params):
+    prefix = 'EXPLAIN QUERY PLAN ' if connection.dialect.name == 'sqlite' else 'EXPLAIN '
+    rows = connection.execute(text(prefix + sql), params).all()
+    return [str(row[-1]) for row in rows]
+
+
+def timing(connection, sql, params, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        connection.execute(text(sql), params).all()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def measure(engine, params, repeat):
+    results = {}
+    with engine.connect() as connection:
+        for name, sql in QUERIES.items():
+            results[name] = (explain(connection, sql, params), timing(connection, sql, params, repeat))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--venues', type=int, default=2000)
+    parser.add_argument('--artists', type=int, default=5000)
+    parser.add_argument('--shows', type=int, default=200000)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--database-url')
+    args = parser.parse_args()
+
+    path = None
+    url = args.database_url
+    if url is None:
+        fd, path = tempfile.mkstemp(suffix='.db')
+        os.close(fd)
+        url = f'sqlite:///{path}'
+    engine = create_engine(url)
+    try:
+        create_schema(engine)
+        indexes = [index for table in db.metadata.sorted_tables for index in table.indexes]
+        for index in indexes:
+            index.drop(engine)
+        now = seed(engine, args.venues, args.artists, args.shows)
+        params = {"venue_id": args.venues // 2, "artist_id": args.artists // 2, "now": now,
+                  "state": 'NY', "city": 'City 7', "genre_bit": GENRE_BITS['Jazz']}
+
+        before = measure(engine, params, args.repeat)
+        for index in indexes:
+            index.create(engine)
+        with engine.begin() as connection:
+            connection.execute(text('ANALYZE'))
+        after = measure(engine, params, args.repeat)
+
+        print(f"{args.venues} venues, {args.artists} artists, {args.shows} shows "
+              f"on {engine.dialect.name}; median of {args.repeat} runs\n")
+        for name in QUERIES:
+            (plan_before, ms_before), (plan_after, ms_after) = before[name], after[name]
+            print(f"{name}: {ms_before:.2f} ms -> {ms_after:.2f} ms")
+            print("  before: " + "\n          ".join(plan_before))
+            print("  after:  " + "\n          ".join(plan_after))
+    finally:
+        engine.dispose()
+        if path:
+            os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
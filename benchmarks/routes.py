@@ -0,0 +1,302 @@
+"""Latency, queries per request and memory for every route, driven through
+the Flask test client against a seeded database.
+
+    python -m benchmarks.routes --venues 10000 --artists 50000 --shows 1000000
+    python -m benchmarks.routes --record-local
+
+Seeds a throwaway SQLite file unless --database-url points at an (empty)
+Postgres database. Results are compared with the committed baseline
+(benchmarks/baseline.json, rewritten with --update-baseline): a route that
+now runs more queries per request or fails more often fails the run.
+Query counts are only compared when the catalog size matches the
+baseline's (the defaults do).
+
+Latency is never gated against the committed baseline; timings from
+another checkout or CI host are not comparable even when the hardware
+string matches. Record a local baseline with --record-local
+(benchmarks/baseline.local.json, not committed) and later runs on the
+same machine and catalog also fail when a route's median latency grew by
+more than --tolerance.
+
+Every route is expected to run without server errors.
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+
+BASELINE = os.path.join(os.path.dirname(__file__), 'baseline.json')
+LOCAL_BASELINE = os.path.join(os.path.dirname(__file__), 'baseline.local.json')
+
+# latency growth below this many milliseconds is treated as noise
+NOISE_MS = 1.0
+
+
+def machine():
+    # latencies are only comparable between runs on the same kind of host
+    return f"{platform.machine()} {os.cpu_count()} cpus, {platform.python_implementation()} " \
+           f"{platform.python_version()}"
+
+
+def venue_form(i):
+    return {
+        "name": f"Benchmark Venue {i}",
+        "city": "City 7",
+        "state": "NY",
+        "address": f"{i} Bench St",
+        "phone": "5551234567",
+        "image_link": f"https://example.com/bench/venue/{i}.jpg",
+        "genres": ["Jazz", "Folk"],
+        "facebook_link": f"https://facebook.com/benchvenue{i}",
+        "website_link": f"https://example.com/bench/venue/{i}",
+        "seeking_talent": "y",
+        "seeking_description": "Looking for local acts",
+    }
+
+
+def artist_form(i):
+    return {
+        "name": f"Benchmark Artist {i}",
+        "city": "City 7",
+        "state": "NY",
+        "phone": "5557654321",
+        "image_link": f"https://example.com/bench/artist/{i}.jpg",
+        "genres": ["Rock n Roll"],
+        "facebook_link": f"https://facebook.com/benchartist{i}",
+        "website_link": f"https://example.com/bench/artist/{i}",
+        "seeking_venue": "y",
+        "seeking_description": "Looking for gigs",
+    }
+
+
+def show_form(size, i):
+    return {
+        "artist_id": str(i % size['artists'] + 1),
+        "venue_id": str(i % size['venues'] + 1),
+        "start_time": "2030-01-01 20:00:00",
+    }
+
+
+# name -> (method, path(size, i), form data(size, i) or None); reads first,
+# then the writes, which change the catalog the reads were measured on
+ROUTES = {
+    'home': ('GET', lambda size, i: '/', None),
+    'venues': ('GET', lambda size, i: '/venues', None),
+    # an Area.cursor() for the start of the states from M on, about halfway
+    'venues next page': ('GET', lambda size, i: '/venues?after=0:M:', None),
+    'venue search': ('GET', lambda size, i: '/venues/search?search_term=hall', None),
+    'venue detail': ('GET', lambda size, i: f"/venues/{i % size['venues'] + 1}", None),
+    'venue edit form': ('GET', lambda size, i: f"/venues/{i % size['venues'] + 1}/edit", None),
+    'venue create form': ('GET', lambda size, i: '/venues/create', None),
+    'artists': ('GET', lambda size, i: '/artists', None),
+    'artists next page': ('GET', lambda size, i: f"/artists?after={size['artists'] // 2}", None),
+    'artist search': ('POST', lambda size, i: '/artists/search', lambda size, i: {"search_term": "band"}),
+    'artist detail': ('GET', lambda size, i: f"/artists/{i % size['artists'] + 1}", None),
+    'artist edit form': ('GET', lambda size, i: f"/artists/{i % size['artists'] + 1}/edit", None),
+    'artist create form': ('GET', lambda size, i: '/artists/create', None),
+    'shows': ('GET', lambda size, i: '/shows', None),
+    'shows this weekend': ('GET', lambda size, i: '/shows?window=weekend', None),
+    'venue detail month': ('GET', lambda size, i: f"/venues/{i % size['venues'] + 1}?window=month", None),
+    'show create form': ('GET', lambda size, i: '/shows/create', None),
+    'export venues': ('GET', lambda size, i: '/export/venues.csv', None),
+    'api artists': ('GET', lambda size, i: '/api/v1/artists?fields=id,name,genres', None),
+    'api venue detail': ('GET', lambda size, i: f"/api/v1/venues/{i % size['venues'] + 1}", None),
+    'api shows': ('GET', lambda size, i: '/api/v1/shows', None),
+    'create venue': ('POST', lambda size, i: '/venues/create', lambda size, i: venue_form(i)),
+    'edit venue': ('POST', lambda size, i: f"/venues/{i % size['venues'] + 1}/edit",
+                   lambda size, i: venue_form(i)),
+    'create artist': ('POST', lambda size, i: '/artists/create', lambda size, i: artist_form(i)),
+    'edit artist': ('POST', lambda size, i: f"/artists/{i % size['artists'] + 1}/edit",
+                    lambda size, i: artist_form(i)),
+    'create show': ('POST', lambda size, i: '/shows/create', show_form),
+    'delete venue': ('DELETE', lambda size, i: f"/venues/{size['venues'] - i}", None),
+}
+
+
+def percentile(samples, p):
+    # nearest rank
+    ordered = sorted(samples)
+    return ordered[max(0, min(len(ordered) - 1, round(p / 100 * len(ordered)) - 1))]
+
+
+def request(client, size, method, path, data, i):
+    response = client.open(path(size, i), method=method, data=data(size, i) if data else None)
+    response.get_data()
+    response.close()
+    return response.status_code
+
+
+def run_route(client, size, name, requests):
+    import metrics
+
+    method, path, data = ROUTES[name]
+    # warm up outside the measurement
+    request(client, size, method, path, data, requests)
+    metrics.registry.endpoints.clear()
+
+    samples = []
+    errors = 0
+    for i in range(requests):
+        start = time.perf_counter()
+        status = request(client, size, method, path, data, i)
+        samples.append((time.perf_counter() - start) * 1000)
+        if status >= 500:
+            errors += 1
+    counts = [(entry.queries, entry.count) for entry in metrics.registry.endpoints.values()]
+    queries = sum(q for q, _ in counts) / max(1, sum(c for _, c in counts))
+
+    tracemalloc.start()
+    request(client, size, method, path, data, requests + 1)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "p50_ms": round(percentile(samples, 50), 3),
+        "p95_ms": round(percentile(samples, 95), 3),
+        "p99_ms": round(percentile(samples, 99), 3),
+        "queries": round(queries, 2),
+        "peak_kib": round(peak / 1024),
+        "errors": errors,
+    }
+
+
+def regressions(results, baseline, same_catalog):
+    # query counts and server errors, against the committed baseline
+    found = []
+    for name, result in results.items():
+        before = baseline.get('routes', {}).get(name)
+        if before is None:
+            continue
+        # writes run a few more queries when they move a venue to another
+        # area, which depends on the catalog
+        if same_catalog and result['queries'] > before['queries']:
+            found.append(f"{name}: {before['queries']} -> {result['queries']} queries per request")
+        if result['errors'] > before['errors']:
+            found.append(f"{name}: {before['errors']} -> {result['errors']} server errors")
+    return found
+
+
+def slowdowns(results, baseline, tolerance):
+    # median latency, against a baseline recorded on this machine
+    found = []
+    for name, result in results.items():
+        before = baseline.get('routes', {}).get(name)
+        if before is None:
+            continue
+        # the median is gated; the tail percentiles are too noisy on a laptop
+        limit = before['p50_ms'] * (1 + tolerance)
+        if result['p50_ms'] > limit and result['p50_ms'] - before['p50_ms'] > NOISE_MS:
+            found.append(f"{name}: p50 {before['p50_ms']} -> {result['p50_ms']} ms")
+    return found
+
+
+def write_baseline(path, size, results):
+    with open(path, 'w') as f:
+        json.dump({"catalog": size, "machine": machine(), "routes": results}, f, indent=2, sort_keys=True)
+        f.write('\n')
+    print(f"Baseline written to {path}.")
+
+
+def read_baseline(path):
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--venues', type=int, default=1000)
+    parser.add_argument('--artists', type=int, default=5000)
+    parser.add_argument('--shows', type=int, default=100000)
+    parser.add_argument('--requests', type=int, default=50, help='Timed requests per route.')
+    parser.add_argument('--route', action='append', choices=sorted(ROUTES),
+                        help='Only run these routes (repeatable).')
+    parser.add_argument('--database-url')
+    parser.add_argument('--cache', action='store_true',
+                        help='Keep the page cache on (off by default so every request hits the database).')
+    parser.add_argument('--baseline', default=BASELINE)
+    parser.add_argument('--update-baseline', action='store_true',
+                        help='Rewrite the committed baseline (query counts and errors).')
+    parser.add_argument('--local-baseline', default=LOCAL_BASELINE)
+    parser.add_argument('--record-local', action='store_true',
+                        help='Record this run as the local latency baseline.')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='Allowed p50 growth over the local baseline, as a fraction.')
+    args = parser.parse_args()
+
+    path = None
+    url = args.database_url
+    if url is None:
+        fd, path = tempfile.mkstemp(suffix='.db')
+        os.close(fd)
+        url = f'sqlite:///{path}'
+    # config.py reads these when the app is imported below
+    os.environ['DATABASE_URL'] = url
+    os.environ.setdefault('FLASK_DEBUG', '0')
+    os.environ.setdefault('METRICS_ENABLED', '1')
+    if not args.cache:
+        os.environ['CACHE_TYPE'] = 'null'
+
+    from benchmarks.seed import create_schema, seed
+    from app import create_app
+    from models import db
+
+    app = create_app({"WTF_CSRF_ENABLED": False})
+    size = {"venues": args.venues, "artists": args.artists, "shows": args.shows}
+    names = [name for name in ROUTES if not args.route or name in args.route]
+    try:
+        with app.app_context():
+            create_schema(db.engine)
+            seed(db.engine, args.venues, args.artists, args.shows)
+        results = {}
+        with app.test_client() as client:
+            for name in names:
+                results[name] = run_route(client, size, name, args.requests)
+                print(f"{name:20} p50 {results[name]['p50_ms']:8.2f} ms  p95 {results[name]['p95_ms']:8.2f} ms  "
+                      f"p99 {results[name]['p99_ms']:8.2f} ms  {results[name]['queries']:6.2f} queries  "
+                      f"{results[name]['peak_kib']:7d} KiB  {results[name]['errors']} errors")
+        print(f"\n{args.venues} venues, {args.artists} artists, {args.shows} shows on "
+              f"{url.split(':', 1)[0]}; {args.requests} requests per route; "
+              f"max RSS {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // 1024} MiB")
+    finally:
+        with app.app_context():
+            db.engine.dispose()
+        if path:
+            os.remove(path)
+
+    if args.update_baseline or args.record_local:
+        if args.update_baseline:
+            write_baseline(args.baseline, size, results)
+        if args.record_local:
+            write_baseline(args.local_baseline, size, results)
+        return
+    found = []
+    baseline = read_baseline(args.baseline)
+    if baseline is None:
+        print(f"No baseline at {args.baseline}; run with --update-baseline to record one.")
+    else:
+        same_catalog = baseline.get('catalog') == size
+        if not same_catalog:
+            print("Catalog size differs from the baseline; comparing server errors only.")
+        found += regressions(results, baseline, same_catalog)
+    local = read_baseline(args.local_baseline)
+    if local is None:
+        print(f"No local baseline at {args.local_baseline}; latency is not gated "
+              f"(run with --record-local to record one).")
+    elif local.get('catalog') != size or local.get('machine') != machine():
+        print("Local baseline is from another catalog size or machine; latency is not gated.")
+    else:
+        found += slowdowns(results, local, args.tolerance)
+    if found:
+        print("Regressions against the baseline:\n  " + "\n  ".join(found))
+        sys.exit(1)
+    print("No regressions against the baseline.")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+import random
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert
+
+from forms import state_choices
+from models import GENRES, Area, Artist, Show, Venue, db, genre_mask, normalize_search_text
+
+# ----------------------------------------------------------------------------#
+# Synthetic catalog for the benchmarks.
+# ----------------------------------------------------------------------------#
+
+BATCH = 10000
+STATES = [state for state, _ in state_choices]
+
+
+def batched(rows):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == BATCH:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def entities(kind, count, rng):
+    for i in range(1, count + 1):
+        name = f"{kind} {i} {rng.choice(['Band', 'Hall', 'Trio', 'Club', 'Room'])}"
+        city = f"City {rng.randrange(50)}"
+        state = rng.choice(STATES)
+        yield {
+            "id": i,
+            "name": name,
+            "city": city,
+            "state": state,
+            "phone": str(rng.randrange(10 ** 9)),
+            "image_link": f"https://example.com/{kind}/{i}.jpg",
+            "facebook_link": f"https://facebook.com/{kind}{i}",
+            "website": f"https://example.com/{kind}/{i}",
+            "seeking_description": "",
+            "genre_mask": genre_mask(rng.sample(GENRES, rng.randint(1, 3))),
+            "search_text": normalize_search_text(name, city, state),
+        }
+
+
+def show_rows(venues, artists, shows, rng, now):
+    for _ in range(shows):
+        yield {
+            "artist_id": rng.randint(1, artists),
+            "venue_id": rng.randint(1, venues),
+            "start_time": now + timedelta(minutes=rng.randint(-365 * 24 * 60, 365 * 24 * 60)),
+        }
+
+
+def seed(engine, venues, artists, shows, random_seed=0):
+    """Fill an empty schema with a reproducible synthetic catalog."""
+    rng = random.Random(random_seed)
+    now = datetime.now()
+    with engine.begin() as connection:
+        for rows in batched(dict(row, address=f"{i} Main St", seeking_talent=False)
+                            for i, row in enumerate(entities('Venue', venues, rng), start=1)):
+            connection.execute(insert(Venue), rows)
+        for rows in batched(dict(row, seeking_venue=False) for row in entities('Artist', artists, rng)):
+            connection.execute(insert(Artist), rows)
+        for rows in batched(show_rows(venues, artists, shows, rng, now)):
+            connection.execute(insert(Show), rows)
+        for statement in Show.recount_statements(now) + Area.rebuild_statements():
+            connection.execute(statement)
+    return now
+
+
+def create_schema(engine):
+    db.metadata.drop_all(engine)
+    db.metadata.create_all(engine)
@@ -0,0 +1,277 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from functools import wraps
+from inspect import iscoroutinefunction
+
+from flask import Response, current_app, g, make_response, request, session
+from werkzeug.http import is_resource_modified
+
+from models import Artist, Venue
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+# ----------------------------------------------------------------------------#
+# Page cache.
+#
+# Rendered listing and detail pages are cached by full path and tagged with
+# the entities they show ('venues', 'venue:3', ...). Handlers that commit a
+# change call the invalidate_* helpers below, which drop every page carrying
+# the affected tags. Under @conditional the key also carries the page's
+# version, so a change made by another process (another worker's
+# in-process cache, a cron job) is never served from a stale entry.
+# ----------------------------------------------------------------------------#
+
+
+class NullCache:
+
+    def get(self, key):
+        return None
+
+    def set(self, key, value, tags):
+        pass
+
+    def invalidate(self, tags):
+        pass
+
+
+class LRUCache:
+    # in-process, bounded to maxsize entries, each living at most ttl seconds
+
+    def __init__(self, maxsize=1024, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        # tag -> keys and key -> tags, pruned together whenever an entry goes
+        self.tags = {}
+        self.key_tags = {}
+        self.lock = threading.Lock()
+
+    def drop(self, key):
+        # caller holds the lock
+        self.entries.pop(key, None)
+        for tag in self.key_tags.pop(key, ()):
+            keys = self.tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.tags[tag]
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires < time.monotonic():
+                self.drop(key)
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, tags):
+        with self.lock:
+            self.drop(key)
+            self.entries[key] = (value, time.monotonic() + self.ttl)
+            self.key_tags[key] = set(tags)
+            for tag in tags:
+                self.tags.setdefault(tag, set()).add(key)
+            while len(self.entries) > self.maxsize:
+                self.drop(next(iter(self.entries)))
+
+    def invalidate(self, tags):
+        with self.lock:
+            for tag in tags:
+                for key in list(self.tags.get(tag, ())):
+                    self.drop(key)
+
+
+class RedisCache:
+    # shared between processes; works with any client exposing the redis-py
+    # get/set/sadd/smembers/expire/delete calls (e.g. a local stand-in).
+    # The cache is never the source of truth, so an unreachable server is
+    # logged and the request goes on: a failed get is a miss, a failed set
+    # or invalidate is dropped (under @conditional stale entries are keyed
+    # on an old version and never served; the rest expire after ttl).
+
+    def __init__(self, client, ttl=300, prefix='fyyur:'):
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def failed(self, operation, e):
+        current_app.logger.warning('page cache %s failed: %s: %s', operation, type(e).__name__, e)
+
+    def get(self, key):
+        try:
+            return self.client.get(self.prefix + 'page:' + key)
+        except Exception as e:
+            self.failed('get', e)
+            return None
+
+    def set(self, key, value, tags):
+        key = self.prefix + 'page:' + key
+        try:
+            self.client.set(key, value, ex=self.ttl)
+            for tag in tags:
+                self.client.sadd(self.prefix + 'tag:' + tag, key)
+                self.client.expire(self.prefix + 'tag:' + tag, self.ttl)
+        except Exception as e:
+            self.failed('set', e)
+
+    def invalidate(self, tags):
+        try:
+            for tag in tags:
+                tag = self.prefix + 'tag:' + tag
+                keys = self.client.smembers(tag)
+                self.client.delete(tag, *keys)
+        except Exception as e:
+            self.failed('invalidate', e)
+
+
+def make_backend(config):
+    kind = config['CACHE_TYPE']
+    if kind == 'lru':
+        return LRUCache(maxsize=config['CACHE_MAXSIZE'], ttl=config['CACHE_TTL'])
+    if kind == 'redis':
+        if redis is None:
+            raise RuntimeError("CACHE_TYPE 'redis' requires the redis package")
+        return RedisCache(redis.Redis.from_url(config['CACHE_REDIS_URL']), ttl=config['CACHE_TTL'])
+    return NullCache()
+
+
+backend = NullCache()
+
+
+def init_app(app):
+    global backend
+    backend = make_backend(app.config)
+
+
+def cached(*tags):
+    # tags are format strings filled in from the view's arguments,
+    # e.g. @cached('artist:{artist_id}'); works on sync and async views
+    def lookup():
+        # pages rendered with pending flash messages are per-user
+        if session.get('_flashes'):
+            return None, None
+        key = request.full_path
+        if g.get('page_etag'):
+            key += '#' + g.page_etag
+        return key, backend.get(key)
+
+    def store(key, rv, kwargs):
+        response = make_response(rv)
+        # a streamed page is sent as it renders; reading it here would
+        # buffer the whole body first, so it is not cached
+        if key is not None and response.status_code == 200 and not response.is_streamed:
+            backend.set(key, response.get_data(), [tag.format(**kwargs) for tag in tags])
+        return response
+
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapper(**kwargs):
+                key, body = lookup()
+                if body is not None:
+                    return body
+                return store(key, await view(**kwargs), kwargs)
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(**kwargs):
+            key, body = lookup()
+            if body is not None:
+                return body
+            return store(key, view(**kwargs), kwargs)
+        return wrapper
+    return decorator
+
+
+# ----------------------------------------------------------------------------#
+# Conditional GET.
+#
+# A version function returns a small tuple that changes whenever the page
+# would (updated_at columns, counts), or None when the entity is missing.
+# It is hashed into a strong ETag and checked against If-None-Match before
+# the view runs any of its queries (If-Modified-Since too, when the tuple
+# is all timestamps); @cached underneath keys its entry on the same ETag
+# (g.page_etag). Async views take an async version function.
+# ----------------------------------------------------------------------------#
+
+def conditional(version):
+    def validators(state):
+        etag = hashlib.sha1(repr((request.full_path, tuple(state))).encode()).hexdigest()
+        g.page_etag = etag
+        # Last-Modified only stands in for the version when the version is
+        # nothing but timestamps; counts and window dates change without
+        # any updated_at moving, and If-Modified-Since would miss that
+        if state and all(isinstance(value, datetime) for value in state):
+            return etag, max(state)
+        return etag, None
+
+    def not_modified(etag, last_modified):
+        return not is_resource_modified(request.environ, etag=etag, last_modified=last_modified)
+
+    def finish(response, etag, last_modified):
+        response.set_etag(etag)
+        if last_modified is not None:
+            response.last_modified = last_modified
+        return response
+
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapper(**kwargs):
+                if session.get('_flashes'):
+                    return await view(**kwargs)
+                state = await version(**kwargs)
+                if state is None:
+                    return await view(**kwargs)
+                checked = validators(state)
+                if not_modified(*checked):
+                    return finish(Response(status=304), *checked)
+                return finish(make_response(await view(**kwargs)), *checked)
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(**kwargs):
+            if session.get('_flashes'):
+                return view(**kwargs)
+            state = version(**kwargs)
+            if state is None:
+                return view(**kwargs)
+            checked = validators(state)
+            if not_modified(*checked):
+                return finish(Response(status=304), *checked)
+            return finish(make_response(view(**kwargs)), *checked)
+        return wrapper
+    return decorator
+
+
+def invalidate_artist(artist_id, venue_ids=None):
+    # venue pages list the artist's name and image next to its shows
+    if venue_ids is None:
+        venue_ids = Artist.venue_ids(artist_id)
+    tags = ['artists', 'shows', f'artist:{artist_id}']
+    tags += [f'venue:{venue_id}' for venue_id in venue_ids]
+    backend.invalidate(tags)
+
+
+def invalidate_venue(venue_id, artist_ids=None):
+    # artist pages list the venue's name and image next to its shows;
+    # pass artist_ids when the venue's shows are already gone
+    if artist_ids is None:
+        artist_ids = Venue.artist_ids(venue_id)
+    tags = ['venues', 'shows', f'venue:{venue_id}']
+    tags += [f'artist:{artist_id}' for artist_id in artist_ids]
+    backend.invalidate(tags)
+
+
+def invalidate_show(artist_id, venue_id):
+    backend.invalidate(['venues', 'shows', f'artist:{artist_id}', f'venue:{venue_id}'])
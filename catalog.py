@@ -0,0 +1,332 @@
+import csv
+import io
+import json
+import re
+from functools import lru_cache
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import insert, select
+from sqlalchemy.exc import DBAPIError
+from werkzeug.datastructures import MultiDict
+
+from forms import ArtistForm, VenueForm, ShowForm
+from models import Area, Artist, Show, Venue, db, genre_mask, mask_genres, normalize_search_text
+
+# ----------------------------------------------------------------------------#
+# Bulk import.
+#
+# Rows are streamed from CSV or JSONL, validated with the same forms the
+# create views use, and inserted in batches with one executemany per table.
+# Invalid rows are reported and skipped; the rest of the batch still goes in.
+# CSV columns (and JSONL keys) are the form field names; genres may be a
+# list in JSONL or a ';'/',' separated string in CSV.
+# ----------------------------------------------------------------------------#
+
+TRUE_VALUES = ('y', 'yes', 'true', 't', '1', 'on')
+
+
+def read_rows(path, fmt):
+    # yields (line number, record) without holding the file in memory;
+    # JSONL lines are yielded raw so a bad line only rejects that row
+    with open(path, newline='', encoding='utf-8') as f:
+        if fmt == 'csv':
+            reader = csv.DictReader(f)
+            for record in reader:
+                yield reader.line_num, record
+        else:
+            for line_no, line in enumerate(f, start=1):
+                if line.strip():
+                    yield line_no, line
+
+
+@lru_cache(maxsize=None)
+def text_fields(form_class, flag):
+    return tuple(field.name for field in form_class(meta={'csrf': False})
+                 if field.name not in (flag, 'genres'))
+
+
+def formdata(record, form_class, flag):
+    # fields the record leaves out or sets to null are posted empty, as a
+    # blank form field would be, so they never fall back to form defaults
+    # (ShowForm's start_time) or reach validators as None
+    data = MultiDict()
+    for key, value in record.items():
+        if value is None or key == 'genres':
+            continue
+        if key == flag:
+            if str(value).strip().lower() in TRUE_VALUES:
+                data.add(key, 'y')
+            continue
+        data.add(key, str(value))
+    for name in text_fields(form_class, flag):
+        if name not in data:
+            data.add(name, '')
+    genres = record.get('genres') or []
+    if isinstance(genres, str):
+        genres = re.split(r'[;,]', genres)
+    if not isinstance(genres, list) or not all(isinstance(genre, str) for genre in genres):
+        raise ValueError({"genres": ["must be a list of strings or a ';' separated string"]})
+    for genre in genres:
+        if genre.strip():
+            data.add('genres', genre.strip())
+    return data
+
+
+def artist_values(form):
+    seeking = bool(form.seeking_venue.data)
+    return {
+        "name": form.name.data,
+        "city": form.city.data,
+        "state": form.state.data,
+        "phone": form.phone.data,
+        "image_link": form.image_link.data,
+        "facebook_link": form.facebook_link.data,
+        "website": form.website_link.data,
+        "seeking_venue": seeking,
+        "seeking_description": form.seeking_description.data if seeking else "",
+        "genre_mask": genre_mask(form.genres.data),
+        "search_text": normalize_search_text(form.name.data, form.city.data, form.state.data),
+    }
+
+
+def venue_values(form):
+    seeking = bool(form.seeking_talent.data)
+    return {
+        "name": form.name.data,
+        "city": form.city.data,
+        "state": form.state.data,
+        "address": form.address.data,
+        "phone": form.phone.data,
+        "image_link": form.image_link.data,
+        "facebook_link": form.facebook_link.data,
+        "website": form.website_link.data,
+        "seeking_talent": seeking,
+        "seeking_description": form.seeking_description.data if seeking else "",
+        "genre_mask": genre_mask(form.genres.data),
+        "search_text": normalize_search_text(form.name.data, form.city.data, form.state.data),
+    }
+
+
+def show_values(form):
+    try:
+        return {
+            "artist_id": int(form.artist_id.data),
+            "venue_id": int(form.venue_id.data),
+            "start_time": form.start_time.data,
+        }
+    except (TypeError, ValueError):
+        raise ValueError({"artist_id/venue_id": ["must be integers"]})
+
+
+# kind: (form, model, values, boolean flag field)
+IMPORTERS = {
+    'artists': (ArtistForm, Artist, artist_values, 'seeking_venue'),
+    'venues': (VenueForm, Venue, venue_values, 'seeking_talent'),
+    'shows': (ShowForm, Show, show_values, None),
+}
+
+
+def validate(kind, record):
+    # returns the column values or raises ValueError with form errors
+    form_class, _, values, flag = IMPORTERS[kind]
+    form = form_class(formdata=formdata(record, form_class, flag), meta={'csrf': False})
+    try:
+        valid = form.validate()
+    except Exception as e:
+        # a validator choking on the input rejects this row, not the import
+        raise ValueError({"record": [f"{type(e).__name__}: {e}"]})
+    if not valid:
+        raise ValueError(form.errors)
+    return values(form)
+
+
+def missing_references(batch):
+    # shows whose artist or venue does not exist, checked once per batch
+    artist_ids = {values["artist_id"] for _, values in batch}
+    venue_ids = {values["venue_id"] for _, values in batch}
+    artists = set(db.session.scalars(select(Artist.id).where(Artist.id.in_(artist_ids))))
+    venues = set(db.session.scalars(select(Venue.id).where(Venue.id.in_(venue_ids))))
+    return {line_no for line_no, values in batch
+            if values["artist_id"] not in artists or values["venue_id"] not in venues}
+
+
+def insert_rows(kind, batch):
+    model = IMPORTERS[kind][1]
+    db.session.execute(insert(model), [values for _, values in batch])
+    if model is Show:
+        # core inserts skip the ORM, so the show counters are bumped here
+        Show.count_new([(values["artist_id"], values["venue_id"], values["start_time"])
+                        for _, values in batch])
+    elif model is Venue:
+        Area.refresh({(values["state"], values["city"]) for _, values in batch})
+
+
+def load_batch(kind, batch, report):
+    # one transaction per batch; if the database rejects it, retry row by
+    # row so only the offending rows are reported
+    if kind == 'shows':
+        missing = missing_references(batch)
+        for line_no in sorted(missing):
+            report(line_no, {"artist_id/venue_id": ["no such artist or venue"]})
+        batch = [row for row in batch if row[0] not in missing]
+    if not batch:
+        return 0
+    try:
+        insert_rows(kind, batch)
+        db.session.commit()
+        return len(batch)
+    except DBAPIError:
+        db.session.rollback()
+    loaded = 0
+    for row in batch:
+        try:
+            insert_rows(kind, [row])
+            db.session.commit()
+            loaded += 1
+        except DBAPIError as e:
+            db.session.rollback()
+            report(row[0], str(e.orig))
+    return loaded
+
+
+def import_catalog(kind, path, fmt, batch_size, report):
+    loaded = rejected = 0
+    batch = []
+    for line_no, record in read_rows(path, fmt):
+        try:
+            if isinstance(record, str):
+                record = json.loads(record)
+            if not isinstance(record, dict):
+                raise ValueError({"record": ["must be a JSON object"]})
+            values = validate(kind, record)
+        except ValueError as e:
+            report(line_no, e.args[0])
+            rejected += 1
+            continue
+        batch.append((line_no, values))
+        if len(batch) >= batch_size:
+            count = load_batch(kind, batch, report)
+            loaded += count
+            rejected += len(batch) - count
+            batch = []
+    if batch:
+        count = load_batch(kind, batch, report)
+        loaded += count
+        rejected += len(batch) - count
+    return loaded, rejected
+
+
+@click.command('import-catalog')
+@with_appcontext
+@click.argument('kind', type=click.Choice(sorted(IMPORTERS)))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'jsonl']),
+              help='Defaults to the file extension.')
+@click.option('--batch-size', type=int, help='Rows per INSERT batch.')
+def import_catalog_command(kind, path, fmt, batch_size):
+    """Bulk load artists, venues or shows from a CSV or JSONL file."""
+    fmt = fmt or ('csv' if path.lower().endswith('.csv') else 'jsonl')
+    batch_size = batch_size or current_app.config['IMPORT_BATCH_SIZE']
+
+    def report(line_no, errors):
+        click.echo(f"{path}:{line_no}: {errors}", err=True)
+
+    loaded, rejected = import_catalog(kind, path, fmt, batch_size, report)
+    click.echo(f"Imported {loaded} {kind}, rejected {rejected}.")
+
+
+# ----------------------------------------------------------------------------#
+# Bulk export.
+#
+# Tables are read through a server-side cursor (yield_per) and serialized
+# row by row, so neither the CLI nor the /export endpoint holds a whole
+# table in memory.
+# ----------------------------------------------------------------------------#
+
+EXPORTS = {
+    'artists': Artist,
+    'venues': Venue,
+    'shows': Show,
+}
+
+MIMETYPES = {
+    'csv': 'text/csv',
+    'jsonl': 'application/x-ndjson',
+}
+
+
+# derived columns, not catalog data
+DERIVED_COLUMNS = ('search_text', 'upcoming_shows_count', 'past_shows_count', 'area_id', 'updated_at')
+
+# columns exported under the field name import-catalog reads them from, so
+# an export can be fed straight back in; genre_mask goes out as the genres
+# it holds, in the import format
+EXPORT_NAMES = {
+    'genre_mask': 'genres',
+    'website': 'website_link',
+}
+
+
+def export_columns(kind):
+    return [column for column in EXPORTS[kind].__table__.columns if column.name not in DERIVED_COLUMNS]
+
+
+def export_rows(kind):
+    model = EXPORTS[kind]
+    stmt = select(*export_columns(kind)) \
+        .order_by(*model.__table__.primary_key.columns) \
+        .execution_options(yield_per=current_app.config['EXPORT_BATCH_SIZE'])
+    for row in db.session.execute(stmt):
+        yield row
+
+
+def export_names(kind):
+    return [EXPORT_NAMES.get(column.name, column.name) for column in export_columns(kind)]
+
+
+def export_values(names, row, fmt):
+    if 'genres' not in names:
+        return list(row)
+    values = list(row)
+    i = names.index('genres')
+    genres = mask_genres(values[i])
+    values[i] = ';'.join(genres) if fmt == 'csv' else genres
+    return values
+
+
+def export_lines(kind, fmt):
+    # yields the serialized export one line at a time
+    names = export_names(kind)
+    if fmt == 'csv':
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(names)
+        for row in export_rows(kind):
+            writer.writerow(export_values(names, row, fmt))
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        yield buffer.getvalue()
+    else:
+        for row in export_rows(kind):
+            yield json.dumps(dict(zip(names, export_values(names, row, fmt))), default=str,
+                             separators=(',', ':')) + '\n'
+
+
+@click.command('export-catalog')
+@with_appcontext
+@click.argument('kind', type=click.Choice(sorted(EXPORTS)))
+@click.option('--format', 'fmt', type=click.Choice(sorted(MIMETYPES)), default='jsonl')
+@click.option('--output', type=click.File('w', encoding='utf-8'), default='-',
+              help='Defaults to stdout.')
+def export_catalog_command(kind, fmt, output):
+    """Stream a catalog table as CSV or JSONL."""
+    for line in export_lines(kind, fmt):
+        output.write(line)
+
+
+def init_app(app):
+    app.cli.add_command(import_catalog_command)
+    app.cli.add_command(export_catalog_command)
@@ -0,0 +1,111 @@
+from collections import namedtuple
+from datetime import date, datetime, time, timedelta
+from functools import wraps
+from inspect import iscoroutinefunction
+
+from flask import request
+
+# ----------------------------------------------------------------------------#
+# Date windows.
+#
+# /shows and the artist and venue pages take one of
+#   ?window=weekend|week|month   the current weekend (Friday to Sunday),
+#                                week (Monday to Sunday) or calendar month
+#   ?month=2026-11               a given month
+#   ?from=2026-11-01&to=2026-11-15   a range of days, both inclusive
+# and then only show what starts inside it, next to a per-day count of
+# shows (Show.day_counts_query()). Windows are half-open [start, end) in
+# naive local time, like Show.start_time, so each is one range scan of a
+# start_time index. Anything malformed means no window.
+# ----------------------------------------------------------------------------#
+
+Window = namedtuple('Window', 'start end label')
+
+WINDOW_ARGS = ('window', 'month', 'from', 'to')
+
+# longest ?from=&to= range accepted, in days
+MAX_WINDOW_DAYS = 366
+
+
+def midnight(day):
+    return datetime.combine(day, time.min)
+
+
+def month_window(year, month):
+    first = date(year, month, 1)
+    following = date(year + month // 12, month % 12 + 1, 1)
+    return Window(midnight(first), midnight(following), first.strftime('%B %Y'))
+
+
+def named_window(name, today):
+    if name == 'weekend':
+        # on Saturday or Sunday, the weekend already under way
+        friday = today + timedelta(days=4 - today.weekday())
+        return Window(midnight(friday), midnight(friday + timedelta(days=3)), 'This weekend')
+    if name == 'week':
+        monday = today - timedelta(days=today.weekday())
+        return Window(midnight(monday), midnight(monday + timedelta(days=7)), 'This week')
+    if name == 'month':
+        return month_window(today.year, today.month)._replace(label='This month')
+    return None
+
+
+def requested_window(args, today=None):
+    # the window asked for in the query string args, or None
+    today = today or date.today()
+    try:
+        if args.get('window'):
+            return named_window(args['window'], today)
+        if args.get('month'):
+            year, month = args['month'].split('-')
+            return month_window(int(year), int(month))
+        if args.get('from') and args.get('to'):
+            first = date.fromisoformat(args['from'])
+            last = date.fromisoformat(args['to'])
+            if not 0 <= (last - first).days < MAX_WINDOW_DAYS:
+                return None
+            label = f"{first.isoformat()} to {last.isoformat()}" if first != last else first.isoformat()
+            return Window(midnight(first), midnight(last + timedelta(days=1)), label)
+    except ValueError:
+        return None
+    return None
+
+
+def window_args(args):
+    # the query string arguments that select the window, for next-page links
+    return {name: args[name] for name in WINDOW_ARGS if args.get(name)}
+
+
+def calendar(window, rows):
+    # (day, count) rows from Show.day_counts_query() -> every day of the
+    # window in order, with days without shows counted as 0
+    counts = dict(rows)
+    days = []
+    day = window.start.date()
+    while day < window.end.date():
+        days.append({"day": day, "count": counts.get(day, 0),
+                     "args": {"from": day.isoformat(), "to": day.isoformat()}})
+        day += timedelta(days=1)
+    return days
+
+
+def windowed(version):
+    # wraps a cache.conditional version function so the ETag also covers
+    # the requested window's dates: ?window=week means another week once
+    # Monday comes, with no row changing; version may be async (aio.py)
+    def extend(state):
+        if state is None:
+            return None
+        window = requested_window(request.args)
+        return tuple(state) + ((window.start.date(), window.end.date()) if window else ())
+
+    if iscoroutinefunction(version):
+        @wraps(version)
+        async def async_wrapper(**kwargs):
+            return extend(await version(**kwargs))
+        return async_wrapper
+
+    @wraps(version)
+    def wrapper(**kwargs):
+        return extend(version(**kwargs))
+    return wrapper
@@ -4,12 +4,12 @@ from fabric.contrib.console import confirm
 # prepare for deployment
 
 
-def test():
+def bench():
+    # queries and errors per route against benchmarks/baseline.json, and
+    # latency against benchmarks/baseline.local.json when one was recorded
     with settings(warn_only=True):
-        result = local(
-            "python test_tasks.py -v && python test_users.py -v", capture=True
-        )
-    if result.failed and not confirm("Tests failed. Continue?"):
+        result = local("python -m benchmarks.routes")
+    if result.failed and not confirm("Benchmark regressed. Continue?"):
         abort("Aborted at user request.")
 
 
@@ -23,7 +23,7 @@ def push():
 
 
 def prepare():
-    test()
+    bench()
     commit()
     push()
 
@@ -38,18 +38,11 @@ def heroku():
     local("git push heroku master")
 
 
-def heroku_test():
-    local(
-        "heroku run python test_tasks.py -v && heroku run python test_users.py -v"
-    )
-
-
 def deploy():
     pull()
-    test()
+    bench()
     commit()
     heroku()
-    heroku_test()
 
 # rollback
 
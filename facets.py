@@ -0,0 +1,37 @@
+from models import GENRES
+
+# ----------------------------------------------------------------------------#
+# Genre facets.
+#
+# /venues, /artists and both searches take repeated ?genre= values (AND:
+# every selected genre must match) and show, next to the results, how many
+# of them carry each genre. The counts come from one aggregate over the
+# genre_mask columns (Venue.genre_counts_query(),
+# Artist.genre_counts_query()) restricted to the current results.
+# ----------------------------------------------------------------------------#
+
+
+def requested_genres(values):
+    # known genres only, in vocabulary order, each once
+    wanted = set(values)
+    return [genre for genre in GENRES if genre in wanted]
+
+
+def genre_facets(counts, selected):
+    # counts: the genre_counts_query() row, one count per genre in GENRES
+    # order; each facet carries the genre selection its link switches to
+    # (selected plus or minus that genre)
+    counts = dict(zip(GENRES, counts))
+    facets = []
+    for genre in GENRES:
+        is_selected = genre in selected
+        if not counts.get(genre) and not is_selected:
+            continue
+        facets.append({
+            "genre": genre,
+            "count": counts.get(genre, 0),
+            "selected": is_selected,
+            "genres": [g for g in selected if g != genre] if is_selected
+            else requested_genres(selected + [genre]),
+        })
+    return facets
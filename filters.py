@@ -0,0 +1,47 @@
+from datetime import datetime, timezone
+from functools import lru_cache
+
+import babel
+import babel.dates
+import dateutil.parser
+
+# ----------------------------------------------------------------------------#
+# Filters.
+# ----------------------------------------------------------------------------#
+
+DATETIME_FORMATS = {
+    'full': "EEEE MMMM, d, y 'at' h:mma",
+    'medium': "EE MM, dd, y h:mma",
+    'day': "EEE MMM d",
+}
+
+
+@lru_cache(maxsize=None)
+def datetime_formatter(format, locale):
+    # the compiled Babel pattern and parsed locale, built once per pair
+    pattern = babel.dates.parse_pattern(DATETIME_FORMATS.get(format, format))
+    return pattern, babel.Locale.parse(locale)
+
+
+def format_datetime(value, format='medium', locale='en'):
+    if value is None or value == "":
+        return ""
+    if not isinstance(value, datetime):
+        value = dateutil.parser.parse(str(value))
+    if value.tzinfo is None:
+        # what babel.dates.format_datetime assumes for naive datetimes
+        value = value.replace(tzinfo=timezone.utc)
+    pattern, babel_locale = datetime_formatter(format, locale)
+    return pattern.apply(value, babel_locale)
+
+
+def format_datetimes(values, format='medium', locale='en'):
+    # a whole column at once; repeated timestamps are formatted only once
+    formatted = {}
+    result = []
+    for value in values:
+        key = value if isinstance(value, datetime) else str(value)
+        if key not in formatted:
+            formatted[key] = format_datetime(value, format, locale)
+        result.append(formatted[key])
+    return result
@@ -0,0 +1,46 @@
+# gunicorn settings for production:
+#
+#   gunicorn -c gunicorn.conf.py
+#
+# Workers are preforked from a master that has already imported and warmed
+# the app (wsgi.py). Send HUP to replace the workers gracefully with the
+# current config; since the app is preloaded, deploying new code needs USR2
+# (start a new master) followed by QUIT to the old one.
+#
+# Environment: PORT / BIND, WEB_CONCURRENCY (workers), WEB_THREADS,
+# WEB_TIMEOUT, WEB_MAX_REQUESTS. The app itself reads DATABASE_URL,
+# SECRET_KEY, CACHE_TYPE, ... (see config.py); with several workers the
+# page cache defaults to Redis (CACHE_REDIS_URL) so an invalidation reaches
+# every worker, and SECRET_KEY must be fixed.
+import multiprocessing
+import os
+
+os.environ.setdefault('FLASK_DEBUG', '0')
+
+wsgi_app = 'wsgi:application'
+bind = os.environ.get('BIND', '0.0.0.0:' + os.environ.get('PORT', '8000'))
+
+# the usual (2 x cores) + 1: requests mostly wait on the database
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+# threads per worker overlap requests waiting on the database without
+# another process each; keep DB_POOL_SIZE + DB_MAX_OVERFLOW above this
+threads = int(os.environ.get('WEB_THREADS', 1))
+if workers > 1:
+    os.environ.setdefault('CACHE_TYPE', 'redis')
+preload_app = True
+
+timeout = int(os.environ.get('WEB_TIMEOUT', 30))
+graceful_timeout = 30
+keepalive = 5
+
+# recycle workers now and then, staggered so they do not all restart at once
+max_requests = int(os.environ.get('WEB_MAX_REQUESTS', 1000))
+max_requests_jitter = max_requests // 10
+
+accesslog = '-'
+errorlog = '-'
+
+
+def post_fork(server, worker):
+    from wsgi import application, dispose_engines
+    dispose_engines(application)
@@ -0,0 +1,61 @@
+import click
+from flask.cli import with_appcontext
+
+from models import Area, Show, db
+import cache
+
+# ----------------------------------------------------------------------------#
+# Periodic jobs.
+#
+# Run from cron (or any scheduler) against the primary database, e.g.
+#
+#   */5 * * * *  flask roll-show-counts
+#
+# The interval bounds how long a show that has started is still counted as
+# upcoming on the listings and in search results. recount-shows and
+# rebuild-areas rebuild the derived data from scratch; the app keeps it
+# current on its own, so they are only needed after editing tables by hand.
+#
+# Each job touches updated_at on the rows it changes. That changes the
+# version the web workers key their cached pages on (cache.conditional),
+# so they render fresh pages whatever the cache backend; invalidating the
+# tags below additionally frees the stale entries of a shared (Redis)
+# cache, and is a no-op for another process's in-process LRU.
+# ----------------------------------------------------------------------------#
+
+
+@click.command('roll-show-counts')
+@with_appcontext
+def roll_show_counts_command():
+    """Move shows that have started from the upcoming to the past counters."""
+    moved = Show.roll_counts()
+    db.session.commit()
+    if moved:
+        cache.backend.invalidate(['venues', 'artists'])
+    click.echo(f"Rolled over {moved} shows.")
+
+
+@click.command('recount-shows')
+@with_appcontext
+def recount_shows_command():
+    """Rebuild every artist and venue show counter from the shows table."""
+    Show.recount()
+    db.session.commit()
+    cache.backend.invalidate(['venues', 'artists'])
+    click.echo("Show counters rebuilt.")
+
+
+@click.command('rebuild-areas')
+@with_appcontext
+def rebuild_areas_command():
+    """Rebuild the /venues area rollup from the venues table."""
+    Area.rebuild()
+    db.session.commit()
+    cache.backend.invalidate(['venues'])
+    click.echo("Areas rebuilt.")
+
+
+def init_app(app):
+    app.cli.add_command(roll_show_counts_command)
+    app.cli.add_command(recount_shows_command)
+    app.cli.add_command(rebuild_areas_command)
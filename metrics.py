@@ -0,0 +1,261 @@
+import hashlib
+import re
+import threading
+import time
+
+from flask import Response, before_render_template, current_app, g, has_app_context, \
+    has_request_context, request, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# ----------------------------------------------------------------------------#
+# Instrumentation.
+#
+# Every statement on any engine (primary, replica) is timed through
+# SQLAlchemy's cursor events; every request records its endpoint, status,
+# duration, query count, DB time and template render time (streamed pages
+# once their body has been sent). Totals are kept per endpoint in this
+# process and served at /metrics in the Prometheus text format; with several
+# workers each scrape sees the worker that answered it.
+# Statements slower than SLOW_QUERY_MS and requests issuing more than
+# QUERY_COUNT_WARNING queries (usually an N+1) are logged.
+# Statements are reported by fingerprint, a short hash of their text with
+# literals and IN lists collapsed, so the label set stays bounded by the
+# query shapes in the code; the slow query log maps each back to its text.
+# ----------------------------------------------------------------------------#
+
+# request duration histogram buckets, in seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# slowest statements kept per endpoint
+SLOWEST = 5
+
+
+def normalize_statement(statement):
+    return re.sub(r'\s+', ' ', statement).strip()[:300]
+
+
+def fingerprint(statement):
+    # the same query with other values, or another number of them in an
+    # IN list, gets the same fingerprint
+    shape = re.sub(r'\s+', ' ', statement).strip()
+    shape = re.sub(r"'(?:[^']|'')*'", '?', shape)
+    shape = re.sub(r'\b\d+(?:\.\d+)?\b', '?', shape)
+    shape = re.sub(r'%\(\w+\)s|:\w+|\$\d+|\?', '?', shape)
+    shape = re.sub(r'\(\s*\?(?:\s*,\s*\?)*\s*\)', '(?)', shape)
+    shape = re.sub(r'(?:\(\?\)\s*,\s*)+\(\?\)', '(?)', shape)
+    return hashlib.sha1(shape.encode()).hexdigest()[:12]
+
+
+class RequestStats:
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.render_time = 0.0
+        self.render_start = None
+        self.slowest = []
+
+    def add_query(self, query, elapsed):
+        self.queries += 1
+        self.db_time += elapsed
+        self.slowest = merge_slowest(self.slowest, [(elapsed, query)])
+
+
+def merge_slowest(current, new):
+    # (seconds, fingerprint) pairs, slowest first, one entry per fingerprint
+    best = {}
+    for elapsed, query in current + new:
+        if elapsed > best.get(query, -1):
+            best[query] = elapsed
+    return sorted(((elapsed, query) for query, elapsed in best.items()), reverse=True)[:SLOWEST]
+
+
+class EndpointStats:
+
+    def __init__(self):
+        self.responses = {}
+        self.buckets = [0] * len(BUCKETS)
+        self.count = 0
+        self.duration = 0.0
+        self.queries = 0
+        self.max_queries = 0
+        self.db_time = 0.0
+        self.render_time = 0.0
+        self.slowest = []
+
+
+class Registry:
+
+    def __init__(self):
+        self.endpoints = {}
+        self.lock = threading.Lock()
+
+    def record(self, endpoint, method, status, duration, stats):
+        with self.lock:
+            entry = self.endpoints.setdefault(endpoint, EndpointStats())
+            key = (method, status)
+            entry.responses[key] = entry.responses.get(key, 0) + 1
+            for i, bound in enumerate(BUCKETS):
+                if duration <= bound:
+                    entry.buckets[i] += 1
+            entry.count += 1
+            entry.duration += duration
+            entry.queries += stats.queries
+            entry.max_queries = max(entry.max_queries, stats.queries)
+            entry.db_time += stats.db_time
+            entry.render_time += stats.render_time
+            entry.slowest = merge_slowest(entry.slowest, stats.slowest)
+
+    def render(self):
+        with self.lock:
+            endpoints = sorted(self.endpoints.items())
+            lines = []
+
+            def family(name, kind, help_text, samples):
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                lines.extend(samples)
+
+            family('fyyur_requests_total', 'counter', 'Requests by endpoint, method and status.', [
+                f"fyyur_requests_total{labels(endpoint=endpoint, method=method, status=status)} {count}"
+                for endpoint, entry in endpoints
+                for (method, status), count in sorted(entry.responses.items())])
+
+            samples = []
+            for endpoint, entry in endpoints:
+                for bound, count in zip(BUCKETS, entry.buckets):
+                    samples.append(f"fyyur_request_duration_seconds_bucket"
+                                   f"{labels(endpoint=endpoint, le=repr(bound))} {count}")
+                samples.append(f"fyyur_request_duration_seconds_bucket"
+                               f"{labels(endpoint=endpoint, le='+Inf')} {entry.count}")
+                samples.append(f"fyyur_request_duration_seconds_sum{labels(endpoint=endpoint)} {entry.duration}")
+                samples.append(f"fyyur_request_duration_seconds_count{labels(endpoint=endpoint)} {entry.count}")
+            family('fyyur_request_duration_seconds', 'histogram',
+                   'Time from request start until the response was sent.', samples)
+
+            for name, kind, help_text, attr in (
+                    ('fyyur_db_queries_total', 'counter', 'SQL statements executed.', 'queries'),
+                    ('fyyur_db_queries_max', 'gauge', 'Most SQL statements executed by one request.',
+                     'max_queries'),
+                    ('fyyur_db_duration_seconds_total', 'counter', 'Time spent executing SQL.', 'db_time'),
+                    ('fyyur_render_duration_seconds_total', 'counter', 'Time spent rendering templates.',
+                     'render_time')):
+                family(name, kind, help_text, [
+                    f"{name}{labels(endpoint=endpoint)} {getattr(entry, attr)}"
+                    for endpoint, entry in endpoints])
+
+            family('fyyur_db_slowest_query_seconds', 'gauge',
+                   f'The {SLOWEST} slowest statements seen per endpoint, by fingerprint.', [
+                       f"fyyur_db_slowest_query_seconds{labels(endpoint=endpoint, fingerprint=query)} {elapsed}"
+                       for endpoint, entry in endpoints
+                       for elapsed, query in entry.slowest])
+        return '\n'.join(lines) + '\n'
+
+
+def labels(**values):
+    escaped = (f'{name}="{escape(value)}"' for name, value in values.items())
+    return '{' + ','.join(escaped) + '}'
+
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+registry = Registry()
+
+
+def current_stats():
+    if has_request_context():
+        return g.get('request_stats')
+    return None
+
+
+# ----------------------------------------------------------------------------#
+# Hooks.
+# ----------------------------------------------------------------------------#
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info['query_start'].pop()
+    query = fingerprint(statement)
+    stats = current_stats()
+    if stats is not None:
+        stats.add_query(query, elapsed)
+    if has_app_context() and elapsed * 1000 >= current_app.config['SLOW_QUERY_MS']:
+        current_app.logger.warning('slow query (%.1f ms) in %s [%s]: %s', elapsed * 1000,
+                                   request.endpoint if has_request_context() else 'cli', query,
+                                   normalize_statement(statement))
+
+
+def handle_error(context):
+    # a failed statement never reaches after_cursor_execute; drop its start
+    # time so the next statement on this connection is not timed against it
+    conn = context.connection
+    if conn is not None and context.execution_context is not None and conn.info.get('query_start'):
+        conn.info['query_start'].pop()
+
+
+def start_render(sender, template, context, **extra):
+    stats = current_stats()
+    if stats is not None:
+        stats.render_start = time.perf_counter()
+
+
+def end_render(sender, template, context, **extra):
+    stats = current_stats()
+    if stats is not None and stats.render_start is not None:
+        stats.render_time += time.perf_counter() - stats.render_start
+        stats.render_start = None
+
+
+def start_request():
+    g.request_stats = RequestStats()
+
+
+def finish_request(response):
+    stats = g.get('request_stats')
+    if stats is None:
+        return response
+    app = current_app._get_current_object()
+    endpoint = request.endpoint or 'unmatched'
+    method = request.method
+    if app.debug:
+        response.headers['X-DB-Queries'] = str(stats.queries)
+        response.headers['Server-Timing'] = (f"db;dur={stats.db_time * 1000:.1f}, "
+                                             f"render;dur={stats.render_time * 1000:.1f}")
+
+    def record():
+        duration = time.perf_counter() - stats.start
+        registry.record(endpoint, method, response.status_code, duration, stats)
+        if stats.queries > app.config['QUERY_COUNT_WARNING']:
+            app.logger.warning('%s %s ran %d queries (%.1f ms in the database)', method, endpoint,
+                               stats.queries, stats.db_time * 1000)
+
+    if response.is_streamed:
+        # streamed pages keep querying and rendering after this point
+        response.call_on_close(record)
+    else:
+        record()
+    return response
+
+
+def metrics_view():
+    return Response(registry.render(), mimetype='text/plain; version=0.0.4')
+
+
+def init_app(app):
+    if not event.contains(Engine, 'before_cursor_execute', before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', after_cursor_execute)
+        event.listen(Engine, 'handle_error', handle_error)
+    before_render_template.connect(start_render, app)
+    template_rendered.connect(end_render, app)
+    app.before_request(start_request)
+    app.after_request(finish_request)
+    if app.config['METRICS_ENABLED']:
+        app.add_url_rule('/metrics', 'metrics', metrics_view)
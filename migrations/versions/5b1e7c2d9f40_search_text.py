@@ -0,0 +1,65 @@
+"""add normalized search_text columns and search indexes
+
+Revision ID: 5b1e7c2d9f40
+Revises: 0a39d0d18418
+Create Date: 2026-10-18 09:12:05.114210
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b1e7c2d9f40'
+down_revision = '0a39d0d18418'
+branch_labels = None
+depends_on = None
+
+
+def _sqlite_fts(table):
+    # external-content FTS5 table with the trigram tokenizer, so MATCH does
+    # case-insensitive substring search, kept in sync by triggers
+    op.execute(f"CREATE VIRTUAL TABLE {table}_fts USING fts5("
+               f"search_text, content='{table}', content_rowid='id', tokenize='trigram')")
+    op.execute(f"INSERT INTO {table}_fts({table}_fts) VALUES ('rebuild')")
+    op.execute(f"CREATE TRIGGER {table}_fts_ai AFTER INSERT ON {table} BEGIN "
+               f"INSERT INTO {table}_fts(rowid, search_text) VALUES (new.id, new.search_text); END")
+    op.execute(f"CREATE TRIGGER {table}_fts_ad AFTER DELETE ON {table} BEGIN "
+               f"INSERT INTO {table}_fts({table}_fts, rowid, search_text) "
+               f"VALUES ('delete', old.id, old.search_text); END")
+    op.execute(f"CREATE TRIGGER {table}_fts_au AFTER UPDATE ON {table} BEGIN "
+               f"INSERT INTO {table}_fts({table}_fts, rowid, search_text) "
+               f"VALUES ('delete', old.id, old.search_text); "
+               f"INSERT INTO {table}_fts(rowid, search_text) VALUES (new.id, new.search_text); END")
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    for table in ('artists', 'venues'):
+        op.add_column(table, sa.Column('search_text', sa.String(length=500), nullable=True))
+        # same normalization as models.normalize_search_text()
+        op.execute(f"UPDATE {table} SET search_text = lower(trim("
+                   f"coalesce(name, '') || ' ' || coalesce(city, '') || ' ' || coalesce(state, '')))")
+        if dialect == 'postgresql':
+            op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+            op.create_index(f'ix_{table}_search_text_trgm', table, ['search_text'],
+                            postgresql_using='gin',
+                            postgresql_ops={'search_text': 'gin_trgm_ops'})
+        elif dialect == 'sqlite':
+            _sqlite_fts(table)
+        else:
+            op.create_index(f'ix_{table}_search_text', table, ['search_text'])
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    for table in ('venues', 'artists'):
+        if dialect == 'postgresql':
+            op.drop_index(f'ix_{table}_search_text_trgm', table_name=table)
+        elif dialect == 'sqlite':
+            for suffix in ('ai', 'ad', 'au'):
+                op.execute(f"DROP TRIGGER {table}_fts_{suffix}")
+            op.execute(f"DROP TABLE {table}_fts")
+        else:
+            op.drop_index(f'ix_{table}_search_text', table_name=table)
+        op.drop_column(table, 'search_text')
@@ -0,0 +1,49 @@
+"""upcoming/past show counters on artists and venues
+
+Revision ID: a4f2c8d1e903
+Revises: e7d4a9b0c5f1
+Create Date: 2026-10-18 15:20:11.402318
+
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a4f2c8d1e903'
+down_revision = 'e7d4a9b0c5f1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    for table in ('artists', 'venues'):
+        op.add_column(table, sa.Column('upcoming_shows_count', sa.Integer(), server_default='0', nullable=False))
+        op.add_column(table, sa.Column('past_shows_count', sa.Integer(), server_default='0', nullable=False))
+    rollover = op.create_table(
+        'show_count_rollover',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('rolled_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+
+    # backfill; start_time is stored as naive local time, like datetime.now()
+    now = datetime.now()
+    for table, key in (('artists', 'artist_id'), ('venues', 'venue_id')):
+        op.execute(sa.text(
+            f"UPDATE {table} SET "
+            f"upcoming_shows_count = (SELECT count(*) FROM shows "
+            f"WHERE shows.{key} = {table}.id AND shows.start_time >= :now), "
+            f"past_shows_count = (SELECT count(*) FROM shows "
+            f"WHERE shows.{key} = {table}.id AND shows.start_time < :now)"
+        ).bindparams(now=now))
+    op.bulk_insert(rollover, [{"id": 1, "rolled_at": now}])
+
+
+def downgrade():
+    op.drop_table('show_count_rollover')
+    for table in ('venues', 'artists'):
+        op.drop_column(table, 'past_shows_count')
+        op.drop_column(table, 'upcoming_shows_count')
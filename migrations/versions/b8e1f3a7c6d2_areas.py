@@ -0,0 +1,50 @@
+"""areas rollup of venues by state and city
+
+Revision ID: b8e1f3a7c6d2
+Revises: a4f2c8d1e903
+Create Date: 2026-10-18 16:02:47.918224
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b8e1f3a7c6d2'
+down_revision = 'a4f2c8d1e903'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'areas',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('state', sa.String(length=120), nullable=False),
+        sa.Column('city', sa.String(length=120), nullable=False),
+        sa.Column('venue_count', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('state', 'city', name='uq_areas_state_city')
+    )
+    # no foreign key on SQLite: adding one there means rebuilding venues,
+    # which drops its search triggers
+    op.add_column('venues', sa.Column('area_id', sa.Integer(), nullable=True))
+    if op.get_bind().dialect.name != 'sqlite':
+        op.create_foreign_key('venues_area_id_fkey', 'venues', 'areas', ['area_id'], ['id'])
+    op.create_index('ix_venues_area_id_id', 'venues', ['area_id', 'id'])
+
+    op.execute(
+        "INSERT INTO areas (state, city, venue_count) "
+        "SELECT state, city, count(id) FROM venues "
+        "WHERE state IS NOT NULL AND city IS NOT NULL GROUP BY state, city")
+    op.execute(
+        "UPDATE venues SET area_id = (SELECT areas.id FROM areas "
+        "WHERE areas.state = venues.state AND areas.city = venues.city)")
+
+
+def downgrade():
+    op.drop_index('ix_venues_area_id_id', table_name='venues')
+    if op.get_bind().dialect.name != 'sqlite':
+        op.drop_constraint('venues_area_id_fkey', 'venues', type_='foreignkey')
+    op.drop_column('venues', 'area_id')
+    op.drop_table('areas')
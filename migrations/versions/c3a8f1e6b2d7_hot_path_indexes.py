@@ -0,0 +1,38 @@
+"""add indexes for the show, area and genre access paths
+
+Revision ID: c3a8f1e6b2d7
+Revises: 5b1e7c2d9f40
+Create Date: 2026-10-18 10:41:27.503918
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c3a8f1e6b2d7'
+down_revision = '5b1e7c2d9f40'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # detail pages and upcoming counts: shows of one venue/artist by time
+    op.create_index('ix_shows_venue_id_start_time', 'shows', ['venue_id', 'start_time'])
+    op.create_index('ix_shows_artist_id_start_time', 'shows', ['artist_id', 'start_time'])
+    # /shows keyset pagination on (start_time, show_id)
+    op.create_index('ix_shows_start_time_show_id', 'shows', ['start_time', 'show_id'])
+    # venue directory grouped by area
+    op.create_index('ix_venues_state_city', 'venues', ['state', 'city'])
+    # the genre tables' primary keys lead with the entity id
+    op.create_index('ix_artist_genres_genre_artist_id', 'artist_genres', ['genre', 'artist_id'])
+    op.create_index('ix_venue_genres_genre_venue_id', 'venue_genres', ['genre', 'venue_id'])
+
+
+def downgrade():
+    op.drop_index('ix_venue_genres_genre_venue_id', table_name='venue_genres')
+    op.drop_index('ix_artist_genres_genre_artist_id', table_name='artist_genres')
+    op.drop_index('ix_venues_state_city', table_name='venues')
+    op.drop_index('ix_shows_start_time_show_id', table_name='shows')
+    op.drop_index('ix_shows_artist_id_start_time', table_name='shows')
+    op.drop_index('ix_shows_venue_id_start_time', table_name='shows')
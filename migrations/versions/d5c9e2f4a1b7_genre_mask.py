@@ -0,0 +1,65 @@
+"""genres stored as a bitmask on artists and venues
+
+Revision ID: d5c9e2f4a1b7
+Revises: b8e1f3a7c6d2
+Create Date: 2026-10-18 17:11:05.336190
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd5c9e2f4a1b7'
+down_revision = 'b8e1f3a7c6d2'
+branch_labels = None
+depends_on = None
+
+# forms.genres_choices as of this revision; bit i is GENRES[i]
+GENRES = [
+    'Alternative', 'Blues', 'Classical', 'Country', 'Electronic', 'Folk', 'Funk', 'Hip-Hop',
+    'Heavy Metal', 'Instrumental', 'Jazz', 'Musical Theatre', 'Pop', 'Punk', 'R&B', 'Reggae',
+    'Rock n Roll', 'Soul', 'Other',
+]
+
+TABLES = (('artists', 'artist_genres', 'artist_id'), ('venues', 'venue_genres', 'venue_id'))
+
+
+def upgrade():
+    connection = op.get_bind()
+    # a genre outside the vocabulary has no bit; stop rather than lose it
+    for _, genre_table, _ in TABLES:
+        unknown = connection.execute(
+            sa.text(f"SELECT DISTINCT genre FROM {genre_table} WHERE genre NOT IN :genres")
+            .bindparams(sa.bindparam('genres', expanding=True)),
+            {"genres": GENRES}).scalars().all()
+        if unknown:
+            raise RuntimeError(f"{genre_table} holds genres outside the vocabulary: {unknown}")
+
+    for table, genre_table, key in TABLES:
+        op.add_column(table, sa.Column('genre_mask', sa.Integer(), server_default='0', nullable=False))
+        for bit, genre in enumerate(GENRES):
+            op.execute(sa.text(
+                f"UPDATE {table} SET genre_mask = genre_mask | :bit "
+                f"WHERE id IN (SELECT {key} FROM {genre_table} WHERE genre = :genre)")
+                .bindparams(bit=1 << bit, genre=genre))
+        op.drop_index(f'ix_{genre_table}_genre_{key}', table_name=genre_table)
+        op.drop_table(genre_table)
+
+
+def downgrade():
+    for table, genre_table, key in TABLES:
+        op.create_table(
+            genre_table,
+            sa.Column(key, sa.Integer(), nullable=False),
+            sa.Column('genre', sa.String(length=100), nullable=False),
+            sa.ForeignKeyConstraint([key], [f'{table}.id'], ),
+            sa.PrimaryKeyConstraint(key, 'genre')
+        )
+        op.create_index(f'ix_{genre_table}_genre_{key}', genre_table, ['genre', key])
+        for bit, genre in enumerate(GENRES):
+            op.execute(sa.text(
+                f"INSERT INTO {genre_table} ({key}, genre) "
+                f"SELECT id, :genre FROM {table} WHERE genre_mask & :bit <> 0")
+                .bindparams(bit=1 << bit, genre=genre))
+        op.drop_column(table, 'genre_mask')
@@ -0,0 +1,35 @@
+"""add updated_at to artists, venues and shows for HTTP validators
+
+Revision ID: e7d4a9b0c5f1
+Revises: c3a8f1e6b2d7
+Create Date: 2026-10-18 13:05:52.338410
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e7d4a9b0c5f1'
+down_revision = 'c3a8f1e6b2d7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # left nullable: tightening it would make SQLite rebuild artists/venues
+    # and drop their search triggers; new rows always get a value
+    if op.get_bind().dialect.name == 'postgresql':
+        now = "timezone('utc', now())"
+    else:
+        now = 'CURRENT_TIMESTAMP'
+    for table in ('artists', 'venues', 'shows'):
+        op.add_column(table, sa.Column('updated_at', sa.DateTime(), nullable=True))
+        op.execute(f"UPDATE {table} SET updated_at = {now}")
+        op.create_index(f'ix_{table}_updated_at', table, ['updated_at'])
+
+
+def downgrade():
+    for table in ('shows', 'venues', 'artists'):
+        op.drop_index(f'ix_{table}_updated_at', table_name=table)
+        op.drop_column(table, 'updated_at')
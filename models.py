@@ -1,9 +1,129 @@
+import time
+from datetime import datetime, timezone
+from functools import wraps
+from inspect import iscoroutinefunction
+
+from flask import current_app, g, has_app_context, request, session
 from flask_migrate import Migrate
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session
+from sqlalchemy import and_, case, delete, event, func, insert, or_, select, tuple_, update
+
+from filters import format_datetime
+from forms import genres_choices
+
+
+class RoutingSession(Session):
+    # inside read_only views, reads go to the 'replica' bind when one is
+    # configured (DATABASE_REPLICA_URL); flushes always use the primary,
+    # and so do reads from a client that has just written (see replica_ok)
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and has_app_context() \
+                and g.get('read_replica') and 'replica' in self._db.engines:
+            return self._db.engines['replica']
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def replica_ok():
+    # False for READ_YOUR_WRITES_SECONDS after this client's last write, so
+    # the page it is redirected to is not read from a lagging replica
+    wrote_at = session.get('wrote_at')
+    return wrote_at is None or time.time() - wrote_at > current_app.config['READ_YOUR_WRITES_SECONDS']
+
+
+def remember_write(response):
+    # after_request hook: stamp the session after a write that went through
+    if request.method not in ('GET', 'HEAD', 'OPTIONS') and response.status_code < 400 \
+            and 'replica' in db.engines:
+        session['wrote_at'] = time.time()
+    return response
+
+
+def read_only(view):
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def async_wrapper(*args, **kwargs):
+            g.read_replica = replica_ok()
+            return await view(*args, **kwargs)
+        return async_wrapper
+
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        g.read_replica = replica_ok()
+        return view(*args, **kwargs)
+    return wrapper
+
+
+# bound to the app in app.py (db.init_app, migrate.init_app)
+db = SQLAlchemy(session_options={"class_": RoutingSession})
+migrate = Migrate()
+
+
+# ----------------------------------------------------------------------------#
+# Genres.
+#
+# The vocabulary is the closed list in forms.genres_choices. Artists and
+# venues store theirs in one integer, genre_mask, with bit i set for
+# GENRES[i]; new genres must be appended to the list, never inserted or
+# reordered, or stored masks change meaning.
+# ----------------------------------------------------------------------------#
+
+GENRES = [genre for genre, _ in genres_choices]
+GENRE_BITS = {genre: 1 << i for i, genre in enumerate(GENRES)}
+
+
+def genre_mask(genres):
+    mask = 0
+    for genre in genres:
+        if genre not in GENRE_BITS:
+            raise ValueError(f"unknown genre: {genre}")
+        mask |= GENRE_BITS[genre]
+    return mask
+
+
+def mask_genres(mask):
+    return [genre for genre in GENRES if mask & GENRE_BITS[genre]]
+
+
+def genre_filter(model, genres):
+    # criteria matching entities that have every one of genres
+    if not genres:
+        return []
+    mask = genre_mask(genres)
+    return [model.genre_mask.bitwise_and(mask) == mask]
+
+
+def genre_counts_query(model, criteria=()):
+    # one row: how many entities matching criteria have each genre, in
+    # GENRES order, from a single pass over the rows
+    return db.session.query(*[func.count(case((model.genre_mask.bitwise_and(bit) != 0, 1)))
+                              for bit in GENRE_BITS.values()]).filter(*criteria)
+
+
+def paginate(rows, limit, cursor):
+    # rows were fetched with LIMIT limit + 1; the extra row only tells
+    # whether there is a next page, whose cursor comes from the last kept row
+    if limit is None or len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, cursor(rows[-1])
+
+
+def page_size():
+    # ?limit= for the listings and the API, clamped to MAX_PAGE_SIZE
+    limit = request.args.get('limit', current_app.config['PAGE_SIZE'], type=int)
+    return max(1, min(limit, current_app.config['MAX_PAGE_SIZE']))
+
+
+def utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def normalize_search_text(*parts):
+    # mirrors the backfill in migration 5b1e7c2d9f40
+    return ' '.join(part or '' for part in parts).strip().lower()
 
-from app import format_datetime,app
-db = SQLAlchemy(app)
-migrate = Migrate(app, db)
 
 # ----------------------------------------------------------------------------#
 # Models.
@@ -11,6 +131,10 @@ migrate = Migrate(app, db)
 
 class Venue(db.Model):
     __tablename__ = 'venues'
+    __table_args__ = (
+        db.Index('ix_venues_state_city', 'state', 'city'),
+        db.Index('ix_venues_area_id_id', 'area_id', 'id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String)
@@ -24,15 +148,146 @@ class Venue(db.Model):
     website = db.Column(db.String(500), nullable=True)
     seeking_talent = db.Column(db.Boolean, default=False, nullable=False)
     seeking_description = db.Column(db.String(100), nullable=True)
-    genres = db.relationship('Venue_Genres', backref="venue_genres", lazy=True)
+    genre_mask = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    search_text = db.Column(db.String(500), nullable=True)
+    updated_at = db.Column(db.DateTime, default=utcnow, onupdate=utcnow, index=True)
+    # maintained by Show.count_new() and Show.roll_counts()
+    upcoming_shows_count = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    past_shows_count = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    # maintained by Area.refresh()
+    area_id = db.Column(db.Integer, db.ForeignKey('areas.id'), nullable=True)
 
     def dictforvenues(self):
-        c = len(Show.query.filter_by(venue_id=self.id).all())
         return {"id": self.id,
                 "name": self.name,
-                "num_upcoming_shows": c
+                "num_upcoming_shows": self.upcoming_shows_count
                 }
 
+    @property
+    def genres(self):
+        return mask_genres(self.genre_mask or 0)
+
+    @genres.setter
+    def genres(self, genres):
+        self.genre_mask = genre_mask(genres)
+
+    @staticmethod
+    def genre_filter(genres):
+        return genre_filter(Venue, genres)
+
+    @staticmethod
+    def genre_counts_query(criteria=()):
+        return genre_counts_query(Venue, criteria)
+
+    @staticmethod
+    def touch(venue_ids):
+        # mark pages showing these venues as changed (see version())
+        venue_ids = list(venue_ids)
+        if venue_ids:
+            db.session.execute(update(Venue).where(Venue.id.in_(venue_ids)).values(updated_at=utcnow()))
+
+    @staticmethod
+    def version(venue_id, now=None):
+        # cheap validator for the detail page: the row's updated_at and how
+        # many of its shows have moved into the past, or None if missing
+        return Venue.version_query(venue_id, now).first()
+
+    @staticmethod
+    def version_query(venue_id, now=None):
+        now = now or datetime.now()
+        past = select(func.count(Show.show_id)) \
+            .where(Show.venue_id == venue_id, Show.start_time < now).scalar_subquery()
+        return db.session.query(Venue.updated_at, past).filter(Venue.id == venue_id)
+
+    @staticmethod
+    def listing_version():
+        return Venue.listing_version_query().one()
+
+    @staticmethod
+    def listing_version_query():
+        return db.session.query(func.max(Venue.updated_at), func.count(Venue.id))
+
+    @staticmethod
+    def upcoming_show_counts(venue_ids, now=None):
+        return Show.upcoming_counts(Show.venue_id, venue_ids, now)
+
+    @staticmethod
+    def artist_ids(venue_id):
+        return db.session.scalars(select(Show.artist_id).where(Show.venue_id == venue_id).distinct()).all()
+
+    @staticmethod
+    def detail(venue_id, now=None, window=None):
+        # the venue (genres included, see genre_mask) and every show with
+        # its artist, or only those starting in window (a dates.Window),
+        # flagged past/upcoming in SQL, in one query
+        now = now or datetime.now()
+        rows = db.session.query(Venue,
+                                Show.start_time,
+                                (Show.start_time < now).label('is_past'),
+                                Artist.id.label('artist_id'),
+                                Artist.name.label('artist_name'),
+                                Artist.image_link.label('artist_image_link')) \
+            .outerjoin(Show, and_(Show.venue_id == Venue.id, *Show.in_window(window))) \
+            .outerjoin(Artist, Show.artist_id == Artist.id) \
+            .filter(Venue.id == venue_id) \
+            .order_by(Show.start_time).all()
+        if not rows:
+            return None
+        return Venue.detail_dict(rows[0].Venue, rows)
+
+    @staticmethod
+    def shows_query(venue_id, now=None, window=None, past=None):
+        # the venue's shows as detail() reads them, for fetching apart from
+        # the venue itself; past=True or False keeps only the past or the
+        # upcoming ones, so the halves can be fetched concurrently (aio.py)
+        now = now or datetime.now()
+        query = db.session.query(Show.start_time,
+                                 (Show.start_time < now).label('is_past'),
+                                 Artist.id.label('artist_id'),
+                                 Artist.name.label('artist_name'),
+                                 Artist.image_link.label('artist_image_link')) \
+            .join(Artist, Show.artist_id == Artist.id) \
+            .filter(Show.venue_id == venue_id, *Show.in_window(window))
+        if past is True:
+            query = query.filter(Show.start_time < now)
+        elif past is False:
+            query = query.filter(or_(Show.start_time >= now, Show.start_time.is_(None)))
+        return query.order_by(Show.start_time)
+
+    @staticmethod
+    def detail_dict(venue, rows):
+        # rows carry start_time, is_past and the artist columns of each show
+        past_shows = []
+        upcoming_shows = []
+        for row in rows:
+            if row.artist_id is None:
+                continue
+            show = {
+                "artist_id": row.artist_id,
+                "artist_name": row.artist_name,
+                "artist_image_link": row.artist_image_link,
+                "start_time": row.start_time
+            }
+            (past_shows if row.is_past else upcoming_shows).append(show)
+        return {
+            "id": venue.id,
+            "name": venue.name,
+            "genres": venue.genres,
+            "address": venue.address,
+            "city": venue.city,
+            "state": venue.state,
+            "phone": venue.phone,
+            "website": venue.website,
+            "facebook_link": venue.facebook_link,
+            "seeking_talent": venue.seeking_talent,
+            "seeking_description": venue.seeking_description,
+            "image_link": venue.image_link,
+            "past_shows": past_shows,
+            "upcoming_shows": upcoming_shows,
+            "past_shows_count": len(past_shows),
+            "upcoming_shows_count": len(upcoming_shows),
+        }
+
     def __repr__(self):
         return f"<Venue {self.id}, {self.name}, {self.city}, {self.state}>\n"
 
@@ -40,13 +295,139 @@ class Venue(db.Model):
         return f"<Venue {self.id}, {self.name}, {self.city}>"
 
 
-class Venue_Genres(db.Model):
-    __tablename__ = 'venue_genres'
-    venue_id = db.Column(db.Integer, db.ForeignKey('venues.id'), primary_key=True)
-    genre = db.Column(db.String(100), primary_key=True)
+
+class Area(db.Model):
+    # rollup of venues by (state, city) for the /venues directory, kept up to
+    # date by Area.refresh() wherever venues are added, moved or removed
+    __tablename__ = 'areas'
+    __table_args__ = (
+        db.UniqueConstraint('state', 'city', name='uq_areas_state_city'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    state = db.Column(db.String(120), nullable=False)
+    city = db.Column(db.String(120), nullable=False)
+    venue_count = db.Column(db.Integer, nullable=False, default=0)
+
+    @staticmethod
+    def refresh(keys):
+        # keys: (state, city) of every area that gained or lost a venue in
+        # the current transaction (both sides of a move); recounts just
+        # those, creates or drops their rows and re-points their venues
+        keys = {(state, city) for state, city in keys if state and city}
+        if not keys:
+            return
+        areas = {(area.state, area.city): area
+                 for area in Area.query.filter(tuple_(Area.state, Area.city).in_(keys))}
+        counts = {(state, city): count for state, city, count in
+                  db.session.query(Venue.state, Venue.city, func.count(Venue.id))
+                  .filter(tuple_(Venue.state, Venue.city).in_(keys))
+                  .group_by(Venue.state, Venue.city)}
+        for key, count in counts.items():
+            area = areas.get(key)
+            if area is None:
+                area = Area(state=key[0], city=key[1])
+                db.session.add(area)
+            area.venue_count = count
+        db.session.flush()
+        area_id = select(Area.id).where(Area.state == Venue.state, Area.city == Venue.city).scalar_subquery()
+        # only venues whose area actually changes, so the rest keep their
+        # updated_at (and page versions) and the FTS trigger does not fire
+        db.session.execute(update(Venue).where(tuple_(Venue.state, Venue.city).in_(keys),
+                                               Venue.area_id.is_distinct_from(area_id))
+                           .values(area_id=area_id),
+                           execution_options={"synchronize_session": False})
+        for key, area in areas.items():
+            if key not in counts:
+                db.session.delete(area)
+
+    @staticmethod
+    def rebuild_statements():
+        # recreates the whole rollup from the venues table
+        area_id = select(Area.id).where(Area.state == Venue.state, Area.city == Venue.city).scalar_subquery()
+        return [
+            update(Venue).values(area_id=None),
+            delete(Area),
+            insert(Area).from_select(
+                ['state', 'city', 'venue_count'],
+                select(Venue.state, Venue.city, func.count(Venue.id))
+                .where(Venue.state.isnot(None), Venue.city.isnot(None))
+                .group_by(Venue.state, Venue.city)),
+            update(Venue).values(area_id=area_id),
+        ]
+
+    @staticmethod
+    def rebuild():
+        for statement in Area.rebuild_statements():
+            db.session.execute(statement, execution_options={"synchronize_session": False})
+
+    @staticmethod
+    def venue_filter(state=None, genres=()):
+        # criteria on Venue for the directory's ?state= and ?genre= filters
+        criteria = Venue.genre_filter(genres)
+        if state:
+            criteria.append(Venue.state == state)
+        return criteria
+
+    @staticmethod
+    def cursor(row):
+        # the last venue of a page, with its area's state and city, so the
+        # next page starts in the right place even once that venue or its
+        # whole area is gone
+        return f"{row.id}:{row.state}:{row.city}"
+
+    @staticmethod
+    def parse_cursor(value):
+        # inverse of Area.cursor() -> (state, city, venue id); anything
+        # malformed starts from the top
+        try:
+            venue_id, state, city = value.split(':', 2)
+            return state, city, int(venue_id)
+        except (AttributeError, ValueError):
+            return None
+
+    @staticmethod
+    def venues_query(after=None, limit=None, state=None, genres=()):
+        # the directory's venues in (state, city, venue id) order, seeking
+        # past after (see parse_cursor); a page holds at most limit venues
+        # and may stop inside an area, which the next page then continues
+        query = db.session.query(Area.state, Area.city, Venue.id, Venue.name,
+                                 Venue.upcoming_shows_count.label('num_upcoming_shows')) \
+            .join(Venue, Venue.area_id == Area.id) \
+            .filter(*Venue.genre_filter(genres))
+        if state:
+            query = query.filter(Area.state == state)
+        if after is not None:
+            after_state, after_city, after_id = after
+            query = query.filter(or_(tuple_(Area.state, Area.city) > tuple_(after_state, after_city),
+                                     and_(Area.state == after_state, Area.city == after_city,
+                                          Venue.id > after_id)))
+        query = query.order_by(Area.state, Area.city, Venue.id)
+        if limit is not None:
+            query = query.limit(limit + 1)
+        return query
+
+    @staticmethod
+    def directory_dict(rows):
+        # consecutive rows of one area -> one entry listing its venues
+        areas = []
+        for row in rows:
+            if not areas or (areas[-1]["state"], areas[-1]["city"]) != (row.state, row.city):
+                areas.append({"city": row.city, "state": row.state, "venues": []})
+            areas[-1]["venues"].append({
+                "id": row.id,
+                "name": row.name,
+                "num_upcoming_shows": row.num_upcoming_shows
+            })
+        return areas
+
+    @staticmethod
+    def directory(after=None, limit=None, state=None, genres=()):
+        # one page of the /venues directory and the next cursor
+        rows, next_cursor = paginate(Area.venues_query(after, limit, state, genres).all(), limit, Area.cursor)
+        return Area.directory_dict(rows), next_cursor
 
     def __repr__(self):
-        return f"<Venue_Genres {self.venue_id}, {self.genre}>"
+        return f"<Area {self.id}, {self.city}, {self.state}, {self.venue_count}>"
 
 
 class Artist(db.Model):
@@ -62,7 +443,12 @@ class Artist(db.Model):
     seeking_venue = db.Column(db.Boolean, default=False, nullable=False)
     seeking_description = db.Column(db.String(100), nullable=True)
     shows = db.relationship("Show", backref="artist", lazy=True)
-    genres = db.relationship('Artist_Genres', backref="artist_genres", lazy=True)
+    genre_mask = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    search_text = db.Column(db.String(500), nullable=True)
+    updated_at = db.Column(db.DateTime, default=utcnow, onupdate=utcnow, index=True)
+    # maintained by Show.count_new() and Show.roll_counts()
+    upcoming_shows_count = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    past_shows_count = db.Column(db.Integer, default=0, server_default='0', nullable=False)
 
     def dictforartists(self):
         return {
@@ -70,63 +456,371 @@ class Artist(db.Model):
             "name": self.name
         }
 
+    @staticmethod
+    def page_query(after=None, limit=None, genres=()):
+        # keyset page over Artist.id
+        query = db.session.query(Artist.id, Artist.name).filter(*Artist.genre_filter(genres))
+        if after is not None:
+            query = query.filter(Artist.id > after)
+        query = query.order_by(Artist.id)
+        if limit is not None:
+            query = query.limit(limit + 1)
+        return query
+
+    @staticmethod
+    def page(after=None, limit=None, genres=()):
+        # returns the rows and the next cursor
+        return paginate(Artist.page_query(after, limit, genres).all(), limit, lambda row: row.id)
+
     def dictforsearchartists(self):
-        artist_shows = Show.query.filter_by(artist_id=self.id).all()
-        count = 0
-        for artist_show in artist_shows:
-            if artist_show.start_time is None or artist_show.start_time >= datetime.now():
-                count += 1
         return {
             "id": self.id,
             "name": self.name,
-            "num_upcoming_shows": count
+            "num_upcoming_shows": self.upcoming_shows_count
+        }
+
+    @property
+    def genres(self):
+        return mask_genres(self.genre_mask or 0)
+
+    @genres.setter
+    def genres(self, genres):
+        self.genre_mask = genre_mask(genres)
+
+    @staticmethod
+    def genre_filter(genres):
+        return genre_filter(Artist, genres)
+
+    @staticmethod
+    def genre_counts_query(criteria=()):
+        return genre_counts_query(Artist, criteria)
+
+    @staticmethod
+    def touch(artist_ids):
+        # mark pages showing these artists as changed (see version())
+        artist_ids = list(artist_ids)
+        if artist_ids:
+            db.session.execute(update(Artist).where(Artist.id.in_(artist_ids)).values(updated_at=utcnow()))
+
+    @staticmethod
+    def version(artist_id, now=None):
+        # cheap validator for the detail page: the row's updated_at and how
+        # many of its shows have moved into the past, or None if missing
+        return Artist.version_query(artist_id, now).first()
+
+    @staticmethod
+    def version_query(artist_id, now=None):
+        now = now or datetime.now()
+        past = select(func.count(Show.show_id)) \
+            .where(Show.artist_id == artist_id, Show.start_time < now).scalar_subquery()
+        return db.session.query(Artist.updated_at, past).filter(Artist.id == artist_id)
+
+    @staticmethod
+    def listing_version():
+        return Artist.listing_version_query().one()
+
+    @staticmethod
+    def listing_version_query():
+        return db.session.query(func.max(Artist.updated_at), func.count(Artist.id))
+
+    @staticmethod
+    def upcoming_show_counts(artist_ids, now=None):
+        return Show.upcoming_counts(Show.artist_id, artist_ids, now)
+
+    @staticmethod
+    def venue_ids(artist_id):
+        return db.session.scalars(select(Show.venue_id).where(Show.artist_id == artist_id).distinct()).all()
+
+    @staticmethod
+    def detail(artist_id, now=None, window=None):
+        # the artist (genres included, see genre_mask) and every show with
+        # its venue, or only those starting in window (a dates.Window),
+        # flagged past/upcoming in SQL, in one query
+        now = now or datetime.now()
+        rows = db.session.query(Artist,
+                                Show.start_time,
+                                (Show.start_time < now).label('is_past'),
+                                Venue.id.label('venue_id'),
+                                Venue.name.label('venue_name'),
+                                Venue.image_link.label('venue_image_link')) \
+            .outerjoin(Show, and_(Show.artist_id == Artist.id, *Show.in_window(window))) \
+            .outerjoin(Venue, Show.venue_id == Venue.id) \
+            .filter(Artist.id == artist_id) \
+            .order_by(Show.start_time).all()
+        if not rows:
+            return None
+        return Artist.detail_dict(rows[0].Artist, rows)
+
+    @staticmethod
+    def shows_query(artist_id, now=None, window=None, past=None):
+        # the artist's shows as detail() reads them, for fetching apart from
+        # the artist itself; past=True or False keeps only the past or the
+        # upcoming ones, so the halves can be fetched concurrently (aio.py)
+        now = now or datetime.now()
+        query = db.session.query(Show.start_time,
+                                 (Show.start_time < now).label('is_past'),
+                                 Venue.id.label('venue_id'),
+                                 Venue.name.label('venue_name'),
+                                 Venue.image_link.label('venue_image_link')) \
+            .join(Venue, Show.venue_id == Venue.id) \
+            .filter(Show.artist_id == artist_id, *Show.in_window(window))
+        if past is True:
+            query = query.filter(Show.start_time < now)
+        elif past is False:
+            query = query.filter(or_(Show.start_time >= now, Show.start_time.is_(None)))
+        return query.order_by(Show.start_time)
+
+    @staticmethod
+    def detail_dict(artist, rows):
+        # rows carry start_time, is_past and the venue columns of each show
+        past_shows = []
+        upcoming_shows = []
+        for row in rows:
+            if row.venue_id is None:
+                continue
+            show = {
+                "venue_id": row.venue_id,
+                "venue_name": row.venue_name,
+                "venue_image_link": row.venue_image_link,
+                "start_time": row.start_time
+            }
+            (past_shows if row.is_past else upcoming_shows).append(show)
+        return {
+            "id": artist.id,
+            "name": artist.name,
+            "genres": artist.genres,
+            "city": artist.city,
+            "state": artist.state,
+            "phone": artist.phone,
+            "website": artist.website,
+            "facebook_link": artist.facebook_link,
+            "seeking_venue": artist.seeking_venue,
+            "seeking_description": artist.seeking_description,
+            "image_link": artist.image_link,
+            "past_shows": past_shows,
+            "upcoming_shows": upcoming_shows,
+            "past_shows_count": len(past_shows),
+            "upcoming_shows_count": len(upcoming_shows),
         }
 
     def __repr__(self):
         return f"<Artist {self.id}, {self.name}>"
 
 
-class Artist_Genres(db.Model):
-    __tablename__ = 'artist_genres'
-    artist_id = db.Column(db.Integer, db.ForeignKey('artists.id'), primary_key=True)
-    genre = db.Column(db.String(100), primary_key=True)
+@event.listens_for(Venue, 'before_insert')
+@event.listens_for(Venue, 'before_update')
+@event.listens_for(Artist, 'before_insert')
+@event.listens_for(Artist, 'before_update')
+def set_search_text(mapper, connection, target):
+    target.search_text = normalize_search_text(target.name, target.city, target.state)
 
-    def __repr__(self):
-        return f"<Artist_Genres {self.artist_id}, {self.genre}>"
 
 
 class Show(db.Model):
     __tablename__ = "shows"
+    __table_args__ = (
+        db.Index('ix_shows_venue_id_start_time', 'venue_id', 'start_time'),
+        db.Index('ix_shows_artist_id_start_time', 'artist_id', 'start_time'),
+        db.Index('ix_shows_start_time_show_id', 'start_time', 'show_id'),
+    )
     show_id = db.Column(db.Integer, primary_key=True)
     artist_id = db.Column(db.Integer, db.ForeignKey('artists.id'), primary_key=False)
     venue_id = db.Column(db.Integer, db.ForeignKey('venues.id'), primary_key=False)
     start_time = db.Column(db.DateTime, nullable=True)
+    updated_at = db.Column(db.DateTime, default=utcnow, onupdate=utcnow, index=True)
 
     def __repr__(self):
         return f"<Show {self.show_id}, {self.venue_id}, {self.artist_id}, {format_datetime(value=self.start_time)}>"
 
-    def dictforshows(self):
-        return {
-            "venue_id": self.venue_id,
-            "venue_name": Venue.query.get(self.venue_id),
-            "artist_id": self.artist_id,
-            "artist_name": Artist.query.get(self.artist_id).name,
-            "artist_image_link": Artist.query.get(self.artist_id).image_link,
-            "start_time": format_datetime(self.start_time)
-        }
+    @staticmethod
+    def listing_version():
+        return Show.listing_version_query().one()
 
-    def dictforvenues(self):
-        return {
-            "artist_id": self.artist_id,
-            "artist_name": Artist.query.get(self.artist_id).name,
-            "artist_image_link": Artist.query.get(self.artist_id).image_link,
-            "start_time": format_datetime(self.start_time)
-        }
+    @staticmethod
+    def listing_version_query():
+        # the listing shows artist and venue names next to each show
+        return db.session.query(func.max(Show.updated_at),
+                                select(func.max(Artist.updated_at)).scalar_subquery(),
+                                select(func.max(Venue.updated_at)).scalar_subquery(),
+                                select(func.count(Venue.id)).scalar_subquery())
 
-    def dictforartists(self):
-        return {
-            "venue_id": self.venue_id,
-            "venue_name": Venue.query.get(self.venue_id).name,
-            "venue_image_link": Venue.query.get(self.venue_id).image_link,
-            "start_time": self.start_time
-        }
+    # ------------------------------------------------------------------------
+    # Artist and Venue keep upcoming_shows_count / past_shows_count columns.
+    # A show counts as past once it started before the last rollover
+    # (Show_Count_Rollover.rolled_at), so the counters lag real time by at
+    # most the interval of the `flask roll-show-counts` job.
+    # ------------------------------------------------------------------------
+
+    @staticmethod
+    def rolled_at(lock=False):
+        # lock=True holds the rollover row (FOR SHARE on Postgres) until the
+        # transaction ends, so a concurrent roll_counts() cannot miss a show
+        # that is being counted against the old rolled_at
+        query = select(Show_Count_Rollover.rolled_at)
+        if lock:
+            query = query.with_for_update(read=True)
+        return db.session.scalars(query).first()
+
+    @staticmethod
+    def bump_counts(key_deltas, columns, model):
+        # {id: delta} -> one UPDATE per distinct delta
+        by_delta = {}
+        for entity_id, delta in key_deltas.items():
+            by_delta.setdefault(delta, []).append(entity_id)
+        for delta, ids in by_delta.items():
+            values = {getattr(model, column): getattr(model, column) + sign * delta for column, sign in columns}
+            values[model.updated_at] = utcnow()
+            db.session.execute(update(model).where(model.id.in_(ids)).values(values))
+
+    @staticmethod
+    def count_new(shows):
+        # shows: (artist_id, venue_id, start_time) of rows inserted in the
+        # current transaction; adds them to the counters and touches the
+        # artists and venues
+        rolled_at = Show.rolled_at(lock=True)
+        deltas = {}
+        for artist_id, venue_id, start_time in shows:
+            if start_time is None:
+                continue
+            past = rolled_at is not None and start_time < rolled_at
+            column = 'past_shows_count' if past else 'upcoming_shows_count'
+            for model, entity_id in ((Artist, artist_id), (Venue, venue_id)):
+                key = (model, column)
+                deltas.setdefault(key, {})
+                deltas[key][int(entity_id)] = deltas[key].get(int(entity_id), 0) + 1
+        for (model, column), key_deltas in deltas.items():
+            Show.bump_counts(key_deltas, [(column, 1)], model)
+
+    @staticmethod
+    def roll_counts(now=None):
+        # moves shows that started since the last rollover from upcoming to
+        # past; returns how many shows moved
+        now = now or datetime.now()
+        state = db.session.scalars(select(Show_Count_Rollover).with_for_update()).first()
+        started = [Show.start_time < now]
+        if state is not None:
+            started.append(Show.start_time >= state.rolled_at)
+        moved = db.session.query(func.count(Show.show_id)).filter(*started).scalar()
+        for key, model in ((Show.artist_id, Artist), (Show.venue_id, Venue)):
+            rows = db.session.query(key, func.count(Show.show_id)) \
+                .filter(key.isnot(None), *started).group_by(key).all()
+            Show.bump_counts(dict(rows), [('upcoming_shows_count', -1), ('past_shows_count', 1)], model)
+        if state is None:
+            db.session.add(Show_Count_Rollover(rolled_at=now))
+        else:
+            state.rolled_at = now
+        return moved
+
+    @staticmethod
+    def recount_statements(now):
+        # rebuilds every counter from the shows table
+        statements = []
+        for key, model in ((Show.artist_id, Artist), (Show.venue_id, Venue)):
+            upcoming = select(func.count(Show.show_id)) \
+                .where(key == model.id, Show.start_time >= now).scalar_subquery()
+            past = select(func.count(Show.show_id)) \
+                .where(key == model.id, Show.start_time < now).scalar_subquery()
+            statements.append(update(model).values(upcoming_shows_count=upcoming, past_shows_count=past))
+        statements.append(delete(Show_Count_Rollover))
+        statements.append(insert(Show_Count_Rollover).values(rolled_at=now))
+        return statements
+
+    @staticmethod
+    def recount(now=None):
+        now = now or datetime.now()
+        for statement in Show.recount_statements(now):
+            db.session.execute(statement)
+
+    @staticmethod
+    def upcoming_counts(key, ids, now=None):
+        # {id: number of upcoming shows} for a whole page of artist or venue
+        # ids (key: Show.artist_id or Show.venue_id) in one query; ids
+        # without upcoming shows are left out. Read from the counters as of
+        # the last rollover, or counted from the shows as of now when given.
+        ids = list(ids)
+        if not ids:
+            return {}
+        if now is None:
+            model = Artist if key is Show.artist_id else Venue
+            rows = db.session.query(model.id, model.upcoming_shows_count) \
+                .filter(model.id.in_(ids), model.upcoming_shows_count > 0).all()
+        else:
+            rows = db.session.query(key, func.count(Show.show_id)) \
+                .filter(key.in_(ids), Show.start_time >= now) \
+                .group_by(key).all()
+        return dict(rows)
+
+    @staticmethod
+    def cursor(row):
+        return Show.make_cursor(row.start_time, row.show_id)
+
+    @staticmethod
+    def make_cursor(start_time, show_id):
+        # listings leave shows without a start_time out, so it is always set
+        return f"{start_time.isoformat()}_{show_id}"
+
+    @staticmethod
+    def parse_cursor(value):
+        # inverse of Show.cursor(); anything malformed starts from the top
+        try:
+            start_time, show_id = value.rsplit('_', 1)
+            return datetime.fromisoformat(start_time), int(show_id)
+        except (AttributeError, ValueError):
+            return None
+
+    @staticmethod
+    def in_window(window):
+        # criteria for shows starting in window (a dates.Window), or none
+        if window is None:
+            return []
+        return [Show.start_time >= window.start, Show.start_time < window.end]
+
+    @staticmethod
+    def day_counts_query(window, *criteria):
+        # (day, count) of the shows in window matching criteria, e.g.
+        # Show.venue_id == 3; a range scan of a start_time index
+        day = func.date(Show.start_time, type_=db.Date)
+        return db.session.query(day, func.count(Show.show_id)) \
+            .filter(*Show.in_window(window), *criteria) \
+            .group_by(day).order_by(day)
+
+    @staticmethod
+    def listing_query(after=None, limit=None, window=None):
+        # flat rows carrying everything shows.html needs, without building
+        # ORM objects, seeking past (start_time, show_id) instead of OFFSET.
+        # Shows without a start_time have no place in the order and are
+        # left out
+        query = db.session.query(Show.show_id,
+                                 Show.venue_id,
+                                 Venue.name.label('venue_name'),
+                                 Show.artist_id,
+                                 Artist.name.label('artist_name'),
+                                 Artist.image_link.label('artist_image_link'),
+                                 Show.start_time) \
+            .join(Artist, Show.artist_id == Artist.id) \
+            .join(Venue, Show.venue_id == Venue.id) \
+            .filter(Show.start_time.isnot(None), *Show.in_window(window))
+        if after is not None:
+            query = query.filter(tuple_(Show.start_time, Show.show_id) > tuple_(*after))
+        query = query.order_by(Show.start_time, Show.show_id)
+        if limit is not None:
+            query = query.limit(limit + 1)
+        return query
+
+    @staticmethod
+    def listing(after=None, limit=None, window=None):
+        # returns the rows and the cursor of the next page, if any
+        query = Show.listing_query(after, limit, window)
+        if limit is None:
+            return query.yield_per(500), None
+        return paginate(query.all(), limit, Show.cursor)
+
+
+class Show_Count_Rollover(db.Model):
+    # single row: when the show counters were last rolled over
+    __tablename__ = 'show_count_rollover'
+    id = db.Column(db.Integer, primary_key=True)
+    rolled_at = db.Column(db.DateTime, nullable=False)
+
+    def __repr__(self):
+        return f"<Show_Count_Rollover {self.rolled_at}>"
@@ -0,0 +1,55 @@
+from sqlalchemy import text
+
+from models import Artist, Venue, db, normalize_search_text
+
+# ----------------------------------------------------------------------------#
+# Search.
+#
+# Artists and venues carry a lowercased search_text column (name, city and
+# state) maintained by models.set_search_text. On Postgres it is covered by
+# a pg_trgm GIN index, which serves the substring LIKE below; on SQLite the
+# migration adds a trigram FTS5 table (<table>_fts) queried with MATCH.
+# ----------------------------------------------------------------------------#
+
+# FTS5's trigram tokenizer cannot match terms shorter than one trigram
+MIN_FTS_TERM = 3
+
+_fts_tables = {}
+
+
+def has_fts(table):
+    engine = db.engine
+    key = (engine.url, table)
+    if key not in _fts_tables:
+        with engine.connect() as connection:
+            _fts_tables[key] = connection.execute(
+                text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                {"name": f"{table}_fts"}).first() is not None
+    return _fts_tables[key]
+
+
+def criteria(model, search_term, genres=()):
+    # where clauses for the search, also used for its genre facet counts
+    clauses = model.genre_filter(genres)
+    term = normalize_search_text(search_term)
+    if not term:
+        return clauses
+    table = model.__tablename__
+    if db.engine.dialect.name == 'sqlite' and len(term) >= MIN_FTS_TERM and has_fts(table):
+        phrase = '"' + term.replace('"', '""') + '"'
+        ids = text(f"SELECT rowid FROM {table}_fts WHERE {table}_fts MATCH :phrase") \
+            .bindparams(phrase=phrase)
+        return clauses + [model.id.in_(ids)]
+    return clauses + [model.search_text.contains(term, autoescape=True)]
+
+
+def matching(model, search_term, genres=()):
+    return model.query.filter(*criteria(model, search_term, genres))
+
+
+def search_venues(search_term, genres=()):
+    return matching(Venue, search_term, genres).order_by(Venue.name, Venue.id).all()
+
+
+def search_artists(search_term, genres=()):
+    return matching(Artist, search_term, genres).order_by(Artist.name, Artist.id).all()
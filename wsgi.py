@@ -0,0 +1,21 @@
+# Production WSGI entry point:
+#
+#   gunicorn -c gunicorn.conf.py
+#
+# gunicorn.conf.py preloads this module in the master process, so the app,
+# its compiled templates and mappers are built once and shared by every
+# forked worker.
+from app import create_app, warm
+from models import db
+
+
+def dispose_engines(app):
+    # called in each worker after fork: connections opened in the master
+    # must not be shared between processes
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+
+
+application = create_app()
+warm(application)